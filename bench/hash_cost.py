@@ -0,0 +1,57 @@
+"""
+Coste de generar/verificar un hash de contraseña con cada configuración.
+
+Sirve para elegir PASSWORD_HASH_METHOD: el objetivo típico es que un login
+cueste del orden de decenas de milisegundos en la máquina de producción.
+
+    python bench/hash_cost.py --rounds 5
+    python bench/hash_cost.py --methods "scrypt:16384:8:1,pbkdf2:sha256:600000"
+"""
+import argparse
+import json
+import statistics
+import time
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHODS = [
+    "scrypt:16384:8:1",
+    "scrypt:32768:8:1",
+    "scrypt:65536:8:1",
+    "pbkdf2:sha256:260000",
+    "pbkdf2:sha256:600000",
+    "pbkdf2:sha256:1000000",
+]
+
+
+def measure(method, rounds, password="correct horse battery staple"):
+    hash_ms, check_ms = [], []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        pwhash = generate_password_hash(password, method)
+        hash_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        check_password_hash(pwhash, password)
+        check_ms.append((time.perf_counter() - start) * 1000)
+    return {
+        "method": method,
+        "rounds": rounds,
+        "hash_ms": {"median": round(statistics.median(hash_ms), 2), "max": round(max(hash_ms), 2)},
+        "check_ms": {"median": round(statistics.median(check_ms), 2), "max": round(max(check_ms), 2)},
+        "checks_per_second_per_core": round(1000 / statistics.median(check_ms), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coste de hash de contraseñas por configuración")
+    parser.add_argument("--methods", default=",".join(DEFAULT_METHODS))
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    methods = [m.strip() for m in args.methods.split(",") if m.strip()]
+    print(json.dumps([measure(m, args.rounds) for m in methods], indent=2))
+
+
+if __name__ == "__main__":
+    main()
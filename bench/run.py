@@ -0,0 +1,303 @@
+"""
+Benchmark de la API contra servicios falsos (Jamendo, SMTP y Stripe).
+
+Levanta los stubs de bench/stubs.py, arranca la app en un servidor con hilos
+sobre una base SQLite temporal y lanza cada escenario con N hilos durante un
+tiempo fijo. El resultado (throughput y p50/p95/p99) sale en JSON para poder
+compararlo entre commits:
+
+    python bench/run.py --concurrency 16 --duration 10 --output bench_output.json
+    python bench/run.py --scenarios mood --jamendo-latency-ms 200
+
+Con --url se ataca un servidor ya arrancado (que debe apuntar a los stubs);
+en ese caso los escenarios con login necesitan --email/--password.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import FakeJamendo, SMTPSink, sign_stripe_payload, checkout_completed_event, MOODS  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ["token", "register", "playlists", "mood", "webhook"]
+BENCH_PASSWORD = "bench-password-123"
+WEBHOOK_SECRET = "whsec_bench"
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, ok):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds * 1000)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        out = {}
+        for name, values in self.samples.items():
+            values.sort()
+            out[name] = {
+                "requests": len(values),
+                "errors": self.errors.get(name, 0),
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "latency_ms": {
+                    "p50": round(percentile(values, 50), 3),
+                    "p95": round(percentile(values, 95), 3),
+                    "p99": round(percentile(values, 99), 3),
+                    "mean": round(sum(values) / len(values), 3),
+                    "max": round(values[-1], 3),
+                },
+            }
+        return out
+
+
+class Client:
+    def __init__(self, base_url, recorder):
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.session = requests.Session()
+
+    def call(self, name, method, path, expected=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=30, **kwargs)
+            ok = response.status_code in expected
+        except requests.RequestException:
+            response, ok = None, False
+        self.recorder.record(name, time.perf_counter() - start, ok)
+        return response
+
+
+def login(client, email, password):
+    res = client.call("token", "POST", "/api/token", json={"email": email, "password": password})
+    if res is not None and res.status_code == 200:
+        return res.json()["access_token"]
+    return None
+
+
+def scenario_token(client, ctx, worker, i):
+    email, password = ctx["accounts"][(worker + i) % len(ctx["accounts"])]
+    login(client, email, password)
+
+
+def scenario_register(client, ctx, worker, i):
+    name = f"bench_{ctx['run_id']}_{worker}_{i}"
+    client.call("register", "POST", "/api/register", expected=(201,), json={
+        "full_name": "Bench User",
+        "username": name,
+        "email": f"{name}@bench.invalid",
+        "password": BENCH_PASSWORD,
+        "confirm_password": BENCH_PASSWORD,
+    })
+
+
+def scenario_playlists(client, ctx, worker, i):
+    headers = {"Authorization": f"Bearer {ctx['tokens'][worker % len(ctx['tokens'])]}"}
+    res = client.call("playlists.create", "POST", "/api/playlists", expected=(201,),
+                      headers=headers, json={"name": f"bench {worker}-{i}"})
+    if res is None or res.status_code != 201:
+        return
+    playlist_id = res.json()["id"]
+    song_id = str(random.randint(1, 5000))
+    client.call("playlists.add_song", "POST", f"/api/playlists/{playlist_id}/songs",
+                expected=(200, 201), headers=headers, json={
+                    "song_id": song_id,
+                    "name": f"Track {song_id}",
+                    "artist": "Bench",
+                    "audio_url": f"https://example.invalid/audio/{song_id}.mp3",
+                    "duration": 180,
+                    "release_date": "2020-01-01",
+                })
+    client.call("playlists.songs", "GET", f"/api/playlists/{playlist_id}/songs", headers=headers)
+    client.call("playlists.list", "GET", "/api/playlists", headers=headers)
+    client.call("playlists.delete", "DELETE", f"/api/playlists/{playlist_id}", headers=headers)
+
+
+def scenario_mood(client, ctx, worker, i):
+    client.call("mood", "GET", f"/api/music/mood/{random.choice(MOODS)}")
+
+
+def scenario_webhook(client, ctx, worker, i):
+    email = ctx["accounts"][i % len(ctx["accounts"])][0] if ctx["accounts"] else "nobody@bench.invalid"
+    payload = checkout_completed_event(email)
+    client.call("webhook", "POST", "/api/webhook", data=payload, headers={
+        "Content-Type": "application/json",
+        "Stripe-Signature": sign_stripe_payload(payload, ctx["webhook_secret"]),
+    })
+
+
+def run_scenario(fn, base_url, ctx, concurrency, duration):
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+
+    def worker(n):
+        client = Client(base_url, recorder)
+        i = 0
+        while time.monotonic() < deadline:
+            fn(client, ctx, n, i)
+            i += 1
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return recorder.summary(time.monotonic() - start)
+
+
+def seed_accounts(app, count, run_id):
+    """Crea usuarios verificados directamente en la base de datos"""
+    from werkzeug.security import generate_password_hash
+    from api.models import db, User
+
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    accounts = []
+    with app.app_context():
+        for n in range(count):
+            email = f"seed_{run_id}_{n}@bench.invalid"
+            db.session.add(User(
+                full_name="Bench Seed",
+                username=f"seed_{run_id}_{n}",
+                email=email,
+                password_hash=password_hash,
+                email_verified=True,
+            ))
+            accounts.append((email, BENCH_PASSWORD))
+        db.session.commit()
+    return accounts
+
+
+def start_local_app(args, jamendo, smtp, db_path):
+    os.environ.update({
+        "JAMENDO_API_URL": jamendo.url,
+        "MAIL_SERVER": "127.0.0.1",
+        "MAIL_PORT": str(smtp.port),
+        "MAIL_USE_TLS": "false",
+        "MAIL_USE_SSL": "false",
+        "MAIL_DEFAULT_SENDER": "bench@bench.invalid",
+        "FRONTEND_URL": "http://localhost:5173",
+        "STRIPE_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+        # Con pocos usuarios sembrados el limitador cortaría el benchmark de login
+        "RATE_LIMIT_ENABLED": "true" if args.rate_limit else "false",
+    })
+    sys.path.insert(0, os.path.join(ROOT, "src"))
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return app, server, f"http://127.0.0.1:{server.server_port}"
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la API con servicios falsos")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="Segundos por escenario")
+    parser.add_argument("--jamendo-latency-ms", type=float, default=80)
+    parser.add_argument("--jamendo-jitter-ms", type=float, default=40)
+    parser.add_argument("--jamendo-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed-users", type=int, default=32)
+    parser.add_argument("--rate-limit", action="store_true", help="Mantener activo el rate limiting")
+    parser.add_argument("--url", default=None, help="Atacar un servidor ya arrancado")
+    parser.add_argument("--email", default=None)
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--webhook-secret", default=WEBHOOK_SECRET)
+    parser.add_argument("--output", default=None, help="Fichero JSON de salida (por defecto stdout)")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    run_id = f"{int(time.time())}{random.randint(0, 999):03d}"
+    ctx = {"run_id": run_id, "accounts": [], "tokens": [], "webhook_secret": args.webhook_secret}
+    jamendo = smtp = server = None
+    tmpdir = tempfile.mkdtemp(prefix="amuzz-bench-")
+
+    if args.url:
+        base_url = args.url
+        if args.email and args.password:
+            ctx["accounts"] = [(args.email, args.password)]
+    else:
+        jamendo = FakeJamendo(latency_ms=args.jamendo_latency_ms, jitter_ms=args.jamendo_jitter_ms,
+                              error_rate=args.jamendo_error_rate).start()
+        smtp = SMTPSink().start()
+        app, server, base_url = start_local_app(args, jamendo, smtp, os.path.join(tmpdir, "bench.db"))
+        ctx["accounts"] = seed_accounts(app, args.seed_users, run_id)
+
+    if ctx["accounts"]:
+        setup_client = Client(base_url, Recorder())
+        ctx["tokens"] = [t for t in (login(setup_client, e, p) for e, p in ctx["accounts"][:args.concurrency]) if t]
+
+    fns = {
+        "token": scenario_token,
+        "register": scenario_register,
+        "playlists": scenario_playlists,
+        "mood": scenario_mood,
+        "webhook": scenario_webhook,
+    }
+    results = {}
+    for name in scenarios:
+        if name in ("token", "playlists") and not (ctx["accounts"] and ctx["tokens"]):
+            print(f"Saltando {name}: no hay cuentas con login", file=sys.stderr)
+            continue
+        print(f"Ejecutando {name} ({args.concurrency} hilos, {args.duration}s)...", file=sys.stderr)
+        results.update(run_scenario(fns[name], base_url, ctx, args.concurrency, args.duration))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "target": args.url or "local",
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "jamendo_latency_ms": None if args.url else args.jamendo_latency_ms,
+            "jamendo_requests": jamendo.requests if jamendo else None,
+            "emails_sent": len(smtp.messages) if smtp else None,
+        },
+        "scenarios": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
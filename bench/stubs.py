@@ -0,0 +1,229 @@
+"""
+Servicios falsos para pruebas de carga sin salir de la máquina:
+
+- FakeJamendo: /v3.0/tracks con latencia configurable
+- SMTPSink: servidor SMTP mínimo que guarda los mensajes en memoria
+- sign_stripe_payload: firma webhooks como lo hace Stripe
+
+Uso suelto: python bench/stubs.py --jamendo-port 8765 --smtp-port 2525
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MOODS = ["happy", "sad", "relax", "party", "latin", "anxiety", "chill", "focus", "energic"]
+GENRES = ["pop", "rock", "electronic", "jazz", "classical", "hiphop", "ambient", "latin"]
+
+
+def fake_track(i):
+    rng = random.Random(i)
+    return {
+        "id": str(i),
+        "name": f"Track {i}",
+        "artist_name": f"Artist {i % 97}",
+        "album_name": f"Album {i % 211}",
+        "audio": f"https://example.invalid/audio/{i}.mp3",
+        "album_image": f"https://example.invalid/img/{i % 211}.jpg",
+        "license_ccurl": "http://creativecommons.org/licenses/by/3.0/",
+        "duration": 90 + i % 240,
+        "releasedate": f"20{10 + i % 15:02d}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+        "waveform": json.dumps({"peaks": [rng.randint(0, 100) for _ in range(960)]}),
+        "musicinfo": {
+            "tags": {
+                "genres": [GENRES[i % len(GENRES)]],
+                "vartags": [MOODS[i % len(MOODS)], MOODS[(i * 7) % len(MOODS)]],
+                "instruments": [],
+            }
+        },
+    }
+
+
+class FakeJamendo:
+    """Imita GET /v3.0/tracks (limit, offset, id, fuzzytags) con latencia fija + jitter"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=80, jitter_ms=40, catalog_size=5000,
+                 error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.tracks = [fake_track(i) for i in range(1, catalog_size + 1)]
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests += 1
+                time.sleep(max(0, stub.latency_ms + random.uniform(-1, 1) * stub.jitter_ms) / 1000)
+                url = urlparse(self.path)
+                if not url.path.rstrip("/").endswith("/tracks"):
+                    return self._send(404, {"error": "not found"})
+                if stub.error_rate and random.random() < stub.error_rate:
+                    return self._send(503, {"error": "unavailable"})
+                return self._send(200, stub.search(parse_qs(url.query)))
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v3.0"
+
+    def search(self, query):
+        limit = min(int(query.get("limit", ["10"])[0]), 200)
+        offset = int(query.get("offset", ["0"])[0])
+        tracks = self.tracks
+        if "id" in query:
+            # parse_qs ya convierte "+" en espacio; Jamendo separa los ids con espacios
+            ids = set(query["id"][0].split())
+            tracks = [t for t in tracks if t["id"] in ids]
+        elif "fuzzytags" in query:
+            tags = set(query["fuzzytags"][0].lower().replace("+", " ").split())
+            tracks = [
+                t for t in tracks
+                if tags & set(t["musicinfo"]["tags"]["vartags"] + t["musicinfo"]["tags"]["genres"])
+            ]
+        page = tracks[offset:offset + limit]
+        return {
+            "headers": {"status": "success", "code": 0, "results_count": len(page)},
+            "results": page,
+        }
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+
+class SMTPSink:
+    """SMTP sin TLS ni auth que acepta todo y guarda los mensajes en memoria"""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.messages = []
+        self.connections = 0
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def handle(self):
+                sink.connections += 1
+                self.reply("220 sink ESMTP")
+                mail_from, rcpt_to = None, []
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode(errors="replace").strip()
+                    verb = command.split(" ", 1)[0].upper()
+                    if verb == "EHLO":
+                        self.wfile.write(b"250-sink\r\n250-8BITMIME\r\n250 SIZE 10485760\r\n")
+                    elif verb == "HELO":
+                        self.reply("250 sink")
+                    elif verb == "MAIL":
+                        mail_from, rcpt_to = command[10:].strip(), []
+                        self.reply("250 OK")
+                    elif verb == "RCPT":
+                        rcpt_to.append(command[8:].strip())
+                        self.reply("250 OK")
+                    elif verb == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        chunks = []
+                        while True:
+                            data_line = self.rfile.readline()
+                            if not data_line or data_line in (b".\r\n", b".\n"):
+                                break
+                            chunks.append(data_line)
+                        sink.messages.append({
+                            "from": mail_from,
+                            "to": rcpt_to,
+                            "data": b"".join(chunks).decode(errors="replace"),
+                        })
+                        self.reply("250 OK queued")
+                    elif verb in ("RSET", "NOOP"):
+                        self.reply("250 OK")
+                    elif verb == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self.server = Server((host, port), Handler)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+
+def sign_stripe_payload(payload, secret, timestamp=None):
+    """Cabecera Stripe-Signature válida para `payload` (bytes o str)"""
+    if isinstance(payload, bytes):
+        payload = payload.decode()
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def checkout_completed_event(email):
+    return json.dumps({
+        "id": f"evt_bench_{random.getrandbits(48):x}",
+        "object": "event",
+        "type": "checkout.session.completed",
+        "data": {"object": {"object": "checkout.session", "metadata": {"email": email}}},
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jamendo-port", type=int, default=8765)
+    parser.add_argument("--smtp-port", type=int, default=2525)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--jitter-ms", type=float, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    jamendo = FakeJamendo(port=args.jamendo_port, latency_ms=args.latency_ms,
+                          jitter_ms=args.jitter_ms, error_rate=args.error_rate).start()
+    smtp = SMTPSink(port=args.smtp_port).start()
+    print(f"JAMENDO_API_URL={jamendo.url}")
+    print(f"MAIL_SERVER=127.0.0.1 MAIL_PORT={smtp.port} MAIL_USE_TLS=false")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"jamendo requests={jamendo.requests} smtp messages={len(smtp.messages)}")
+    except KeyboardInterrupt:
+        pass
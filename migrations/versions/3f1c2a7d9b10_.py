@@ -0,0 +1,33 @@
+"""add user.is_premium
+
+Revision ID: 3f1c2a7d9b10
+Revises: 14be20713deb
+Create Date: 2026-10-18 10:12:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d9b10'
+down_revision = '14be20713deb'
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    # db.create_all() puede haber creado ya la columna en bases nuevas
+    if 'is_premium' in _columns('user'):
+        return
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_premium', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('is_premium')
@@ -0,0 +1,82 @@
+"""hash verification tokens, add user.created_at
+
+Revision ID: 8d2e5b41c7a3
+Revises: 3f1c2a7d9b10
+Create Date: 2026-10-18 16:40:05.512398
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e5b41c7a3'
+down_revision = '3f1c2a7d9b10'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def _columns(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _indexes(table):
+    return {i['name'] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    columns = _columns('user')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        if 'verification_token_hash' not in columns:
+            batch_op.add_column(sa.Column('verification_token_hash', sa.String(length=64), nullable=True))
+        if 'created_at' not in columns:
+            batch_op.add_column(sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+
+    if 'verification_token' in columns:
+        # Sustituye los tokens en claro por su hash, por lotes
+        bind = op.get_bind()
+        user = sa.table('user', sa.column('id', sa.Integer), sa.column('verification_token', sa.String),
+                        sa.column('verification_token_hash', sa.String))
+        last_id = 0
+        while True:
+            rows = bind.execute(
+                sa.select(user.c.id, user.c.verification_token)
+                .where(user.c.id > last_id, user.c.verification_token.isnot(None))
+                .order_by(user.c.id).limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            bind.execute(
+                user.update().where(user.c.id == sa.bindparam('_id')),
+                [{'_id': row_id, 'verification_token_hash': hashlib.sha256(token.encode()).hexdigest()}
+                 for row_id, token in rows],
+            )
+            last_id = rows[-1][0]
+
+        with op.batch_alter_table('user', schema=None) as batch_op:
+            batch_op.drop_column('verification_token')
+
+    indexes = _indexes('user')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        if 'ix_user_verification_token_hash' not in indexes:
+            batch_op.create_index('ix_user_verification_token_hash', ['verification_token_hash'], unique=True)
+        if 'ix_user_verification_token_expires' not in indexes:
+            batch_op.create_index('ix_user_verification_token_expires', ['verification_token_expires'], unique=False)
+        if 'ix_user_email_verified_created_at' not in indexes:
+            batch_op.create_index('ix_user_email_verified_created_at', ['email_verified', 'created_at'], unique=False)
+
+
+def downgrade():
+    # Los tokens pendientes no se pueden recuperar: habrá que reenviar la verificación
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_email_verified_created_at')
+        batch_op.drop_index('ix_user_verification_token_expires')
+        batch_op.drop_index('ix_user_verification_token_hash')
+        batch_op.drop_column('created_at')
+        batch_op.drop_column('verification_token_hash')
+        batch_op.add_column(sa.Column('verification_token', sa.String(length=100), nullable=True))
+        batch_op.create_unique_constraint('uq_user_verification_token', ['verification_token'])
@@ -0,0 +1,47 @@
+"""version counters on playlists and users for ETags
+
+Revision ID: a93c5e7f1d42
+Revises: f7b3d91c4e68
+Create Date: 2026-10-19 12:07:33.615940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a93c5e7f1d42'
+down_revision = 'f7b3d91c4e68'
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _indexes(table):
+    return {i['name'] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if 'version' not in _columns('playlists'):
+        with op.batch_alter_table('playlists', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+    if 'playlists_version' not in _columns('user'):
+        with op.batch_alter_table('user', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('playlists_version', sa.Integer(), server_default='1', nullable=False))
+
+    if 'ix_playlist_songs_track_id' not in _indexes('playlist_songs'):
+        op.create_index('ix_playlist_songs_track_id', 'playlist_songs', ['track_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_playlist_songs_track_id', table_name='playlist_songs')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('playlists_version')
+
+    with op.batch_alter_table('playlists', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,32 @@
+"""add user.is_admin
+
+Revision ID: b7a9c3e2f114
+Revises: 8d2e5b41c7a3
+Create Date: 2026-10-18 18:05:22.904117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7a9c3e2f114'
+down_revision = '8d2e5b41c7a3'
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if 'is_admin' in _columns('user'):
+        return
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_admin', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('is_admin')
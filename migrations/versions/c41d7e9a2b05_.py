@@ -0,0 +1,219 @@
+"""move playlist song metadata into the shared tracks table
+
+Revision ID: c41d7e9a2b05
+Revises: b7a9c3e2f114
+Create Date: 2026-10-18 20:31:47.220913
+
+"""
+import json
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7e9a2b05'
+down_revision = 'b7a9c3e2f114'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+METADATA_COLUMNS = ['song_id', 'name', 'artist', 'audio_url', 'image_url', 'license_url',
+                    'genre', 'duration', 'release_date']
+
+playlist_songs = sa.table(
+    'playlist_songs',
+    sa.column('id', sa.Integer), sa.column('playlist_id', sa.Integer), sa.column('song_id', sa.String),
+    sa.column('name', sa.String), sa.column('artist', sa.String), sa.column('audio_url', sa.String),
+    sa.column('image_url', sa.String), sa.column('license_url', sa.String), sa.column('genre', sa.String),
+    sa.column('duration', sa.Integer), sa.column('release_date', sa.Date),
+    sa.column('track_id', sa.String), sa.column('position', sa.Integer),
+)
+tracks = sa.table(
+    'tracks',
+    sa.column('id', sa.String), sa.column('name', sa.String), sa.column('artist', sa.String),
+    sa.column('audio_url', sa.String), sa.column('image_url', sa.String), sa.column('license_url', sa.String),
+    sa.column('duration', sa.Integer), sa.column('release_date', sa.Date), sa.column('genres', sa.JSON),
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def _columns(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def _genres(value):
+    if not value:
+        return []
+    try:
+        value = json.loads(value)
+    except ValueError:
+        return [value]
+    return [str(g) for g in value if g] if isinstance(value, list) else [str(value)]
+
+
+TRACK_COLUMNS = ['name', 'artist', 'audio_url', 'image_url', 'license_url', 'duration', 'release_date', 'genres']
+
+
+def _track_values(row):
+    return {
+        'name': row.name, 'artist': row.artist, 'audio_url': row.audio_url, 'image_url': row.image_url,
+        'license_url': row.license_url, 'duration': row.duration, 'release_date': row.release_date,
+        'genres': _genres(row.genre),
+    }
+
+
+def _missing(value):
+    return value is None or value == [] or value == ''
+
+
+def _merge(target, values):
+    """Rellena en `target` las columnas vacías con las de una copia más antigua. Devuelve si cambió"""
+    changed = False
+    for column in TRACK_COLUMNS:
+        if _missing(target.get(column)) and not _missing(values[column]):
+            target[column] = values[column]
+            changed = True
+    return changed
+
+
+def _insert_missing_tracks(bind, rows, created):
+    """Crea las canciones que faltan a partir de las copias de `rows` (de la más nueva a la más antigua).
+
+    Cada columna toma el primer valor no vacío en ese orden. `created` son los
+    ids creados en lotes anteriores de esta migración: sus huecos se completan
+    con las copias de este lote. Las que ya estaban en el catálogo no se tocan.
+    """
+    ids = list({row.song_id for row in rows})
+    existing = set(bind.execute(sa.select(tracks.c.id).where(tracks.c.id.in_(ids))).scalars())
+    earlier = {
+        row.id: dict(row._mapping)
+        for row in bind.execute(sa.select(tracks).where(tracks.c.id.in_(list(existing & created))))
+    }
+    new, filled = {}, set()
+    for row in rows:
+        if row.song_id in earlier:
+            if _merge(earlier[row.song_id], _track_values(row)):
+                filled.add(row.song_id)
+        elif row.song_id not in existing:
+            if row.song_id in new:
+                _merge(new[row.song_id], _track_values(row))
+            else:
+                new[row.song_id] = {'id': row.song_id, **_track_values(row), 'updated_at': datetime.utcnow()}
+    if new:
+        bind.execute(tracks.insert(), list(new.values()))
+        created.update(new)
+    for track_id in filled:
+        values = {column: earlier[track_id][column] for column in TRACK_COLUMNS}
+        bind.execute(tracks.update().where(tracks.c.id == track_id).values(**values))
+
+
+def upgrade():
+    if 'track_id' in _columns('playlist_songs'):
+        return
+    bind = op.get_bind()
+
+    if 'tracks' not in _tables():
+        op.create_table(
+            'tracks',
+            sa.Column('id', sa.String(length=50), primary_key=True),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('artist', sa.String(), nullable=False),
+            sa.Column('audio_url', sa.String(), nullable=False),
+            sa.Column('image_url', sa.String(), nullable=True),
+            sa.Column('license_url', sa.String(), nullable=True),
+            sa.Column('duration', sa.Integer(), nullable=True),
+            sa.Column('album_name', sa.String(), nullable=True),
+            sa.Column('release_date', sa.Date(), nullable=True),
+            sa.Column('genres', sa.JSON(), nullable=True),
+            sa.Column('waveform', sa.Text(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        )
+
+    # El índice de búsqueda ya no guarda copias por playlist (rowids impares)
+    if bind.dialect.name == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS playlist_songs_search_ai')
+        op.execute('DROP TRIGGER IF EXISTS playlist_songs_search_ad')
+        if 'track_search' in _tables():
+            op.execute('DELETE FROM track_search WHERE rowid % 2 = 1')
+
+    with op.batch_alter_table('playlist_songs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('track_id', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('position', sa.Integer(), nullable=True))
+
+    # Por lotes, de la entrada más reciente a la más antigua: si una canción
+    # tiene metadatos distintos en varias playlists, cada columna toma el valor
+    # de la copia más nueva que lo tenga. Las canciones que ya están en el
+    # catálogo conservan sus datos.
+    created = set()
+    last_id = None
+    while True:
+        query = sa.select(playlist_songs).order_by(playlist_songs.c.id.desc()).limit(BATCH_SIZE)
+        if last_id is not None:
+            query = query.where(playlist_songs.c.id < last_id)
+        rows = bind.execute(query).all()
+        if not rows:
+            break
+        _insert_missing_tracks(bind, rows, created)
+        # El id de la entrada conserva el orden en que se añadieron
+        bind.execute(
+            playlist_songs.update().where(playlist_songs.c.id == sa.bindparam('_id')),
+            [{'_id': row.id, 'track_id': row.song_id, 'position': row.id} for row in rows],
+        )
+        last_id = rows[-1].id
+
+    with op.batch_alter_table('playlist_songs', schema=None) as batch_op:
+        batch_op.alter_column('track_id', existing_type=sa.String(length=50), nullable=False)
+        batch_op.alter_column('position', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_playlist_songs_track_id_tracks', 'tracks', ['track_id'], ['id'])
+        for column in METADATA_COLUMNS:
+            batch_op.drop_column(column)
+
+
+def downgrade():
+    bind = op.get_bind()
+    with op.batch_alter_table('playlist_songs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('song_id', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('name', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('artist', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('audio_url', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('image_url', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('license_url', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('genre', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('duration', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('release_date', sa.Date(), nullable=True))
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(playlist_songs.c.id.label('entry_id'), tracks)
+            .join(tracks, tracks.c.id == playlist_songs.c.track_id)
+            .where(playlist_songs.c.id > last_id)
+            .order_by(playlist_songs.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            playlist_songs.update().where(playlist_songs.c.id == sa.bindparam('_id')),
+            [{
+                '_id': row.entry_id, 'song_id': row.id, 'name': row.name, 'artist': row.artist,
+                'audio_url': row.audio_url, 'image_url': row.image_url, 'license_url': row.license_url,
+                'genre': json.dumps(row.genres, separators=(',', ':')) if row.genres else None,
+                'duration': row.duration, 'release_date': row.release_date,
+            } for row in rows],
+        )
+        last_id = rows[-1].entry_id
+
+    with op.batch_alter_table('playlist_songs', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_playlist_songs_track_id_tracks', type_='foreignkey')
+        batch_op.drop_column('position')
+        batch_op.drop_column('track_id')
+        batch_op.alter_column('song_id', existing_type=sa.String(length=50), nullable=False)
+        batch_op.alter_column('name', existing_type=sa.String(), nullable=False)
+        batch_op.alter_column('artist', existing_type=sa.String(), nullable=False)
+        batch_op.alter_column('audio_url', existing_type=sa.String(), nullable=False)
@@ -0,0 +1,58 @@
+"""indexes and (playlist_id, track_id) uniqueness for playlist queries
+
+Revision ID: e5a8f03b6d21
+Revises: c41d7e9a2b05
+Create Date: 2026-10-18 22:14:09.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a8f03b6d21'
+down_revision = 'c41d7e9a2b05'
+branch_labels = None
+depends_on = None
+
+playlist_songs = sa.table(
+    'playlist_songs',
+    sa.column('id', sa.Integer), sa.column('playlist_id', sa.Integer), sa.column('track_id', sa.String),
+)
+
+
+def _indexes(table):
+    return {i['name'] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def _unique_constraints(table):
+    return {u['name'] for u in sa.inspect(op.get_bind()).get_unique_constraints(table)}
+
+
+def upgrade():
+    if 'ix_playlists_user_id_id' not in _indexes('playlists'):
+        with op.batch_alter_table('playlists', schema=None) as batch_op:
+            batch_op.create_index('ix_playlists_user_id_id', ['user_id', 'id'], unique=False)
+
+    if 'uq_playlist_songs_playlist_id_track_id' not in _unique_constraints('playlist_songs'):
+        # La comprobación previa de duplicados no era atómica: se conserva la entrada más antigua
+        first = (
+            sa.select(sa.func.min(playlist_songs.c.id))
+            .group_by(playlist_songs.c.playlist_id, playlist_songs.c.track_id)
+        )
+        op.get_bind().execute(playlist_songs.delete().where(playlist_songs.c.id.not_in(first)))
+        with op.batch_alter_table('playlist_songs', schema=None) as batch_op:
+            batch_op.create_unique_constraint('uq_playlist_songs_playlist_id_track_id', ['playlist_id', 'track_id'])
+
+    if 'ix_playlist_songs_playlist_id_position' not in _indexes('playlist_songs'):
+        with op.batch_alter_table('playlist_songs', schema=None) as batch_op:
+            batch_op.create_index('ix_playlist_songs_playlist_id_position', ['playlist_id', 'position'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('playlist_songs', schema=None) as batch_op:
+        batch_op.drop_index('ix_playlist_songs_playlist_id_position')
+        batch_op.drop_constraint('uq_playlist_songs_playlist_id_track_id', type_='unique')
+
+    with op.batch_alter_table('playlists', schema=None) as batch_op:
+        batch_op.drop_index('ix_playlists_user_id_id')
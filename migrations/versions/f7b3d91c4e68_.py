@@ -0,0 +1,107 @@
+"""playlist_songs.position as a sortable string key
+
+Revision ID: f7b3d91c4e68
+Revises: e5a8f03b6d21
+Create Date: 2026-10-19 09:42:51.803176
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7b3d91c4e68'
+down_revision = 'e5a8f03b6d21'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500  # playlists por lote
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+INDEX = 'ix_playlist_songs_playlist_id_position'
+
+playlist_songs = sa.table(
+    'playlist_songs',
+    sa.column('id', sa.Integer), sa.column('playlist_id', sa.Integer),
+    sa.column('position'), sa.column('new_position'),
+)
+
+
+def _position_type():
+    columns = sa.inspect(op.get_bind()).get_columns('playlist_songs')
+    return next(c['type'] for c in columns if c['name'] == 'position')
+
+
+def _spaced_keys(count, width=4):
+    # Igual que api.positions.spaced_keys, copiado para no depender del código de la app
+    base = len(DIGITS)
+    while base ** width < 4 * (count + 1):
+        width += 1
+    step = base ** width // (2 * (count + 1))
+    keys = []
+    for i in range(1, count + 1):
+        value, digits = i * step, []
+        for _ in range(width):
+            value, digit = divmod(value, base)
+            digits.append(DIGITS[digit])
+        keys.append(''.join(reversed(digits)).rstrip('0'))
+    return keys
+
+
+def _renumber(new_values):
+    """Rellena new_position recorriendo cada playlist en su orden actual"""
+    bind = op.get_bind()
+    after = 0
+    while True:
+        playlist_ids = bind.execute(
+            sa.select(playlist_songs.c.playlist_id).distinct()
+            .where(playlist_songs.c.playlist_id > after)
+            .order_by(playlist_songs.c.playlist_id).limit(BATCH_SIZE)
+        ).scalars().all()
+        if not playlist_ids:
+            break
+        rows = bind.execute(
+            sa.select(playlist_songs.c.id, playlist_songs.c.playlist_id)
+            .where(playlist_songs.c.playlist_id.in_(playlist_ids))
+            .order_by(playlist_songs.c.playlist_id, playlist_songs.c.position, playlist_songs.c.id)
+        ).all()
+        by_playlist = {}
+        for row in rows:
+            by_playlist.setdefault(row.playlist_id, []).append(row.id)
+        updates = [
+            {'entry_id': entry_id, 'value': value}
+            for entry_ids in by_playlist.values()
+            for entry_id, value in zip(entry_ids, new_values(len(entry_ids)))
+        ]
+        bind.execute(
+            playlist_songs.update()
+            .where(playlist_songs.c.id == sa.bindparam('entry_id'))
+            .values(new_position=sa.bindparam('value')),
+            updates,
+        )
+        after = playlist_ids[-1]
+
+
+def _replace_position(new_type):
+    with op.batch_alter_table('playlist_songs', schema=None) as batch_op:
+        batch_op.drop_index(INDEX)
+        batch_op.drop_column('position')
+    with op.batch_alter_table('playlist_songs', schema=None) as batch_op:
+        batch_op.alter_column('new_position', new_column_name='position',
+                              existing_type=new_type, nullable=False)
+    op.create_index(INDEX, 'playlist_songs', ['playlist_id', 'position'], unique=False)
+
+
+def upgrade():
+    if isinstance(_position_type(), sa.String):
+        return
+    with op.batch_alter_table('playlist_songs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('new_position', sa.String(length=64), nullable=True))
+    _renumber(_spaced_keys)
+    _replace_position(sa.String(length=64))
+
+
+def downgrade():
+    with op.batch_alter_table('playlist_songs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('new_position', sa.Integer(), nullable=True))
+    _renumber(lambda count: range(1, count + 1))
+    _replace_position(sa.Integer())
@@ -0,0 +1,231 @@
+"""
+Importación masiva de usuarios desde CSV o NDJSON.
+
+Las filas se procesan por lotes de `batch_size`: las contraseñas de cada lote
+se hashean en paralelo en un pool de procesos (el KDF es CPU puro y así no
+compite con el GIL de los hilos de la app), se descartan duplicados con una
+consulta IN por lote y el lote se inserta con un único executemany y un commit.
+
+Los usuarios que entran sin verificar reciben su email de verificación por la
+bandeja de salida, en la misma transacción que el lote; si no,
+`flask purge-expired` los borraría pasados UNVERIFIED_USER_DAYS.
+
+Columnas: full_name, username, email, password y, opcionales, date_of_birth
+(YYYY-MM-DD) y email_verified.
+"""
+import csv
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from types import SimpleNamespace
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import insert, select
+from werkzeug.security import generate_password_hash
+
+from api.models import db, User, new_verification_token
+from api.passwords import hasher
+from api.email_service import render_verification_email
+from api.outbox import enqueue_email
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+IMPORT_HASH_PROCESSES = int(os.getenv("IMPORT_HASH_PROCESSES", os.cpu_count() or 2))
+# Máximo de errores por fila que se devuelven en el informe
+IMPORT_MAX_ERRORS = 100
+# Filas por petición en POST /api/admin/users/import; más allá, `flask import-users`
+IMPORT_REQUEST_MAX_ROWS = int(os.getenv("IMPORT_REQUEST_MAX_ROWS", 200))
+
+REQUIRED_FIELDS = ("full_name", "username", "email", "password")
+TRUE_VALUES = {"1", "true", "yes", "y", "si", "sí"}
+
+
+class ImportTooLarge(ValueError):
+    def __init__(self, max_rows):
+        super().__init__(f"Más de {max_rows} filas")
+        self.max_rows = max_rows
+
+
+class _InlinePool:
+    """Mismo map() que ProcessPoolExecutor pero en el propio proceso"""
+
+    def map(self, fn, iterable, chunksize=1):
+        return map(fn, iterable)
+
+
+def _hash_password(args):
+    password, method = args
+    return generate_password_hash(password, method)
+
+
+def read_rows(stream, fmt):
+    """Itera dicts de un fichero de texto en formato 'csv' o 'ndjson'"""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "ndjson":
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield None
+    else:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+
+def detect_format(filename=None, content_type=None):
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl") or \
+            (filename or "").lower().endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "csv"
+
+
+def _clean(row, verified):
+    if not isinstance(row, dict):
+        raise ValueError("Fila no válida")
+    missing = [f for f in REQUIRED_FIELDS if not str(row.get(f) or "").strip()]
+    if missing:
+        raise ValueError(f"Faltan campos: {', '.join(missing)}")
+    date_of_birth = str(row.get("date_of_birth") or "").strip()
+    email_verified = row.get("email_verified")
+    if isinstance(email_verified, str):
+        email_verified = email_verified.strip().lower() in TRUE_VALUES if email_verified.strip() else None
+    return {
+        "full_name": str(row["full_name"]).strip(),
+        "username": str(row["username"]).strip(),
+        "email": str(row["email"]).strip().lower(),
+        "password": str(row["password"]),
+        "date_of_birth": datetime.strptime(date_of_birth, "%Y-%m-%d").date() if date_of_birth else None,
+        "email_verified": bool(verified if email_verified is None else email_verified),
+    }
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.skipped = 0
+        self.verification_emails = 0
+        self.errors = []
+        self.batches = []
+        self.started = time.perf_counter()
+
+    def error(self, line, reason):
+        self.skipped += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "error": reason})
+
+    def to_dict(self):
+        return {
+            "inserted": self.inserted,
+            "skipped": self.skipped,
+            "verification_emails": self.verification_emails,
+            "errors": sorted(self.errors, key=lambda e: e["line"]),
+            "batches": self.batches,
+            "seconds": round(time.perf_counter() - self.started, 3),
+        }
+
+
+def _insert_batch(pool, batch, report, on_batch, send_verification=True):
+    """batch: [(línea, fila limpia)]"""
+    start = time.perf_counter()
+    emails = {row["email"] for _, row in batch}
+    usernames = {row["username"] for _, row in batch}
+    taken_emails = set(db.session.execute(select(User.email).where(User.email.in_(emails))).scalars())
+    taken_usernames = set(db.session.execute(select(User.username).where(User.username.in_(usernames))).scalars())
+
+    rows = []
+    for line, row in batch:
+        if row["email"] in taken_emails:
+            report.error(line, "Email ya registrado")
+        elif row["username"] in taken_usernames:
+            report.error(line, "Username ya en uso")
+        else:
+            # También descarta duplicados dentro del propio fichero
+            taken_emails.add(row["email"])
+            taken_usernames.add(row["username"])
+            rows.append(row)
+    check_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunksize = max(1, len(rows) // (IMPORT_HASH_PROCESSES * 4))
+    hashes = pool.map(_hash_password, ((row.pop("password"), hasher.method) for row in rows), chunksize=chunksize)
+    for row, password_hash in zip(rows, hashes):
+        row["password_hash"] = password_hash
+    hash_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    emails = []
+    for row in rows:
+        row["verification_token_hash"] = row["verification_token_expires"] = None
+        if send_verification and not row["email_verified"]:
+            token, row["verification_token_hash"], row["verification_token_expires"] = new_verification_token()
+            emails.append((row["email"], render_verification_email(SimpleNamespace(**row), token)))
+    if rows:
+        db.session.execute(insert(User), rows)
+        for recipient, (subject, html) in emails:
+            enqueue_email(recipient, subject, html)
+        db.session.commit()
+        report.verification_emails += len(emails)
+    insert_seconds = time.perf_counter() - start
+
+    report.inserted += len(rows)
+    timing = {
+        "rows": len(batch),
+        "inserted": len(rows),
+        "check_ms": round(check_seconds * 1000, 1),
+        "hash_ms": round(hash_seconds * 1000, 1),
+        "insert_ms": round(insert_seconds * 1000, 1),
+    }
+    report.batches.append(timing)
+    if on_batch:
+        on_batch(timing)
+
+
+def import_users(rows, batch_size=IMPORT_BATCH_SIZE, verified=False, processes=IMPORT_HASH_PROCESSES,
+                 on_batch=None, send_verification=True):
+    """Importa un iterable de dicts. Devuelve un ImportReport.
+
+    Con processes <= 1 las contraseñas se hashean en el propio proceso.
+    """
+    report = ImportReport()
+    numbered = enumerate(rows, start=1)
+    executor = ProcessPoolExecutor(max_workers=processes) if processes > 1 else nullcontext(_InlinePool())
+    with executor as pool:
+        while True:
+            chunk = list(islice(numbered, batch_size))
+            if not chunk:
+                break
+            batch = []
+            for line, raw in chunk:
+                try:
+                    batch.append((line, _clean(raw, verified)))
+                except (ValueError, TypeError) as e:
+                    report.error(line, str(e))
+            if batch:
+                try:
+                    _insert_batch(pool, batch, report, on_batch, send_verification)
+                except Exception:
+                    db.session.rollback()
+                    raise
+    return report
+
+
+def import_stream(binary_stream, fmt, max_rows=None, **kwargs):
+    """Importa desde un stream binario (fichero o cuerpo de la petición) sin cargarlo entero.
+
+    Con max_rows se leen primero las filas y, si hay más, ImportTooLarge sin importar nada.
+    """
+    if not isinstance(binary_stream, io.BufferedIOBase):
+        binary_stream = io.BufferedReader(binary_stream)
+    text = io.TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
+    rows = read_rows(text, fmt)
+    if max_rows is not None:
+        rows = list(islice(rows, max_rows + 1))
+        if len(rows) > max_rows:
+            raise ImportTooLarge(max_rows)
+    return import_users(rows, **kwargs)
@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_key(params, ignore=("client_id",)):
+    """Normaliza los parámetros de una consulta para usarlos como clave de caché"""
+    return tuple(sorted(
+        (str(k), str(v).strip().lower())
+        for k, v in params.items()
+        if k not in ignore and v is not None
+    ))
+
+
+def estimate_size(value):
+    """Tamaño aproximado en bytes del valor una vez serializado a JSON"""
+    try:
+        return len(json.dumps(value, separators=(",", ":"), default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at", "stale_until")
+
+    def __init__(self, value, size, expires_at, stale_until):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+
+
+class ResponseCache:
+    """Caché LRU en memoria con TTL por entrada y stale-while-revalidate.
+
+    Se limita por número de entradas y por bytes. Una entrada expirada se sigue
+    sirviendo durante `stale_ttl` segundos mientras un único hilo en segundo
+    plano la refresca.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=8 * 1024 * 1024, ttl=300, stale_ttl=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, allow_stale=False):
+        """Devuelve el valor cacheado o None. Con allow_stale también entradas expiradas"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at > now or (allow_stale and entry.stale_until > now):
+                self._entries.move_to_end(key)
+                return entry.value
+            return None
+
+    def set(self, key, value, ttl=None, size=None):
+        if size is None:
+            size = estimate_size(value)
+        if size > self.max_bytes:
+            # No cabe, pero la entrada anterior de esta clave ya no vale
+            self.delete(key)
+            return
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        entry = _Entry(value, size, now + ttl, now + ttl + self.stale_ttl)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += size
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
+
+    def get_or_fetch(self, key, fetch, ttl=None):
+        """Sirve desde caché, o llama a `fetch()` y guarda el resultado.
+
+        Si la entrada está expirada pero dentro de la ventana stale, se devuelve
+        tal cual y se lanza un refresco en segundo plano (uno por clave).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.stale_until <= now:
+                self._entries.pop(key)
+                self._bytes -= entry.size
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.expires_at > now:
+                    self.hits += 1
+                    return entry.value
+                self.stale_hits += 1
+                start_refresh = key not in self._refreshing
+                if start_refresh:
+                    self._refreshing.add(key)
+            else:
+                self.misses += 1
+
+        if entry is not None:
+            if start_refresh:
+                threading.Thread(
+                    target=self._refresh, args=(key, fetch, ttl), daemon=True
+                ).start()
+            return entry.value
+
+        value = fetch()
+        self.set(key, value, ttl=ttl)
+        return value
+
+    def _refresh(self, key, fetch, ttl):
+        try:
+            value = fetch()
+            self.set(key, value, ttl=ttl)
+            self.refreshes += 1
+        except Exception as e:
+            self.refresh_errors += 1
+            print(f"Error refrescando caché {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "refreshing": len(self._refreshing),
+            }
@@ -0,0 +1,254 @@
+"""
+Catálogo local de canciones: ingesta por lotes desde Jamendo (o un fichero) y
+lecturas por mood/tag desde nuestra propia base de datos
+"""
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import select, delete, insert, cast, or_, Text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from api.models import db, Track, TrackTag
+from api import jamendo
+from api.versions import touch_tracks
+
+CATALOG_REFRESH_INTERVAL = int(os.getenv("CATALOG_REFRESH_INTERVAL", 3600))
+CATALOG_REFRESH_PAGE_SIZE = 200
+
+TAG_KINDS = {"genres": "genre", "vartags": "vartag", "instruments": "instrument"}
+
+
+def mood_tags(mood):
+    return [t.strip().lower() for t in mood.replace("+", " ").split() if t.strip()]
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def track_row(raw):
+    """Convierte una canción de la API de Jamendo en una fila de `tracks`"""
+    tags = (raw.get("musicinfo") or {}).get("tags") or {}
+    return {
+        "id": str(raw["id"]),
+        "name": raw["name"],
+        "artist": raw["artist_name"],
+        "audio_url": raw["audio"],
+        "image_url": raw.get("album_image") or raw.get("image"),
+        "license_url": raw.get("license_ccurl"),
+        "duration": raw.get("duration"),
+        "album_name": raw.get("album_name"),
+        "release_date": _parse_date(raw.get("releasedate")),
+        "genres": tags.get("genres") or [],
+        "waveform": raw.get("waveform"),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def track_tag_rows(raw):
+    tags = (raw.get("musicinfo") or {}).get("tags") or {}
+    rows = {}
+    for field, kind in TAG_KINDS.items():
+        for tag in tags.get(field) or []:
+            tag = str(tag).strip().lower()[:80]
+            if tag:
+                rows[(tag, kind)] = {"track_id": str(raw["id"]), "tag": tag, "kind": kind}
+    return list(rows.values())
+
+
+def _changed(stmt, column):
+    existing, incoming = Track.__table__.c[column], stmt.excluded[column]
+    if isinstance(existing.type, db.JSON):
+        # json no tiene operador de igualdad en PostgreSQL
+        existing, incoming = cast(existing, Text), cast(incoming, Text)
+    return existing.is_distinct_from(incoming)
+
+
+def _upsert_statement(rows):
+    """Upsert que sólo reescribe las filas que cambian y devuelve sus ids (y los nuevos)"""
+    stmt = _insert_fn()(Track).values(rows)
+    updatable = [c for c in rows[0] if c != "id"]
+    return stmt.on_conflict_do_update(
+        index_elements=[Track.id],
+        set_={c: stmt.excluded[c] for c in updatable},
+        where=or_(*(_changed(stmt, c) for c in updatable if c != "updated_at")),
+    ).returning(Track.id)
+
+
+def _insert_fn():
+    dialect = db.session.get_bind().dialect.name
+    return postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+
+def parse_genres(value):
+    """Géneros en cualquiera de los formatos que envía el frontend -> lista"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return [value]
+    if isinstance(value, list):
+        return [str(g) for g in value if g]
+    return [str(value)]
+
+
+def ensure_tracks(rows):
+    """Inserta en `tracks` las canciones que aún no existen. No hace commit.
+
+    Las que ya existen no se tocan: sus datos son compartidos por todas las
+    playlists y los del catálogo de Jamendo mandan sobre lo que envíe un cliente.
+    """
+    if not rows:
+        return
+    stmt = _insert_fn()(Track).values(rows)
+    db.session.execute(stmt.on_conflict_do_nothing(index_elements=[Track.id]))
+
+
+def upsert_tracks(raw_tracks, batch_size=500):
+    """Inserta o actualiza canciones en lotes, un commit por lote.
+
+    Devuelve una lista con (nº de canciones, segundos) por lote.
+    """
+    batches = []
+    batch = []
+    for raw in raw_tracks:
+        batch.append(raw)
+        if len(batch) >= batch_size:
+            batches.append(_upsert_batch(batch))
+            batch = []
+    if batch:
+        batches.append(_upsert_batch(batch))
+    return batches
+
+
+def _upsert_batch(raw_batch):
+    start = time.perf_counter()
+    # La última versión de cada id gana dentro del lote
+    by_id = {str(raw["id"]): raw for raw in raw_batch}
+    rows = [track_row(raw) for raw in by_id.values()]
+    tag_rows = [tag for raw in by_id.values() for tag in track_tag_rows(raw)]
+    try:
+        changed = db.session.execute(_upsert_statement(rows)).scalars().all()
+        db.session.execute(delete(TrackTag).where(TrackTag.track_id.in_(list(by_id))))
+        if tag_rows:
+            db.session.execute(insert(TrackTag), tag_rows)
+        # Las playlists con canciones que han cambiado devuelven datos nuevos: otro ETag
+        touch_tracks(changed)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows), time.perf_counter() - start
+
+
+def tracks_for_mood(mood, limit=20, offset=0):
+    tags = mood_tags(mood)
+    if not tags:
+        return []
+    matching = select(TrackTag.track_id).where(TrackTag.tag.in_(tags))
+    tracks = db.session.execute(
+        select(Track)
+        .where(Track.id.in_(matching))
+        .order_by(Track.release_date.desc(), Track.id)
+        .limit(limit)
+        .offset(offset)
+    ).scalars().all()
+    return [t.serialize() for t in tracks]
+
+
+def fetch_pages(tags, pages=1, page_size=CATALOG_REFRESH_PAGE_SIZE, **extra):
+    """Recorre páginas de /tracks de Jamendo para unos tags"""
+    for page in range(pages):
+        results = jamendo.client.tracks(
+            limit=page_size,
+            offset=page * page_size,
+            include="musicinfo",
+            audioformat="mp31",
+            fuzzytags=tags,
+            audiodownload_allowed="true",
+            **extra
+        )
+        if not results:
+            break
+        yield results
+        if len(results) < page_size:
+            break
+
+
+class CatalogRefresher:
+    """Hilo en segundo plano que escribe en el catálogo fuera de la petición.
+
+    Recibe canciones ya descargadas (para guardarlas) y peticiones de refresco
+    incremental por mood, limitadas a una cada CATALOG_REFRESH_INTERVAL.
+    """
+
+    def __init__(self, interval=CATALOG_REFRESH_INTERVAL):
+        self.interval = interval
+        self.app = None
+        self._queue = queue.Queue(maxsize=1000)
+        self._last_refresh = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+
+    def _put(self, item):
+        if self.app is None:
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            pass
+
+    def enqueue_tracks(self, raw_tracks):
+        if raw_tracks:
+            self._put(("tracks", list(raw_tracks)))
+
+    def request_refresh(self, mood):
+        key = " ".join(mood_tags(mood))
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_refresh.get(key)
+            if last is not None and now - last < self.interval:
+                return
+            self._last_refresh[key] = now
+        self._put(("refresh", key))
+
+    def _run(self):
+        while True:
+            kind, payload = self._queue.get()
+            try:
+                with self.app.app_context():
+                    if kind == "tracks":
+                        upsert_tracks(payload)
+                    elif kind == "refresh":
+                        # Incremental: sólo la primera página de lo más reciente
+                        for page in fetch_pages(payload, pages=1, order="releasedate_desc"):
+                            upsert_tracks(page)
+            except Exception as e:
+                print(f"Error actualizando catálogo ({kind}): {e}")
+            finally:
+                self._queue.task_done()
+
+
+refresher = CatalogRefresher()
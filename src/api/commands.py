@@ -1,18 +1,154 @@
 import click
+import json
+import time
 from api.models import db, User
-from werkzeug.security import generate_password_hash
+
+
+def _print_batch(timing):
+    print(f"Lote de {timing['rows']} filas: {timing['inserted']} insertadas "
+          f"(hash {timing['hash_ms']:.0f} ms, insert {timing['insert_ms']:.0f} ms)")
+
 
 def setup_commands(app):
     @app.cli.command("insert-test-users")
     @click.argument("count")
-    def insert_test_users(count):
+    @click.option("--batch-size", default=1000, help="Usuarios por executemany")
+    def insert_test_users(count, batch_size):
+        """Crea usuarios de prueba verificados (test_userN@test.com / 123456)"""
+        from api.bulk_import import import_users
+
         print("Creating test users")
-        for x in range(1, int(count) + 1):
-            user = User(
-                user_name=f"test_user{x}",
-                email=f"test_user{x}@test.com",
-                password_hash=generate_password_hash("123456")
-            )
-            db.session.add(user)
+        rows = ({
+            "full_name": f"Test User {x}",
+            "username": f"test_user{x}",
+            "email": f"test_user{x}@test.com",
+            "password": "123456",
+        } for x in range(1, int(count) + 1))
+        report = import_users(rows, batch_size=batch_size, verified=True, on_batch=_print_batch)
+        print(f"{report.inserted} test users created, {report.skipped} skipped "
+              f"in {time.perf_counter() - report.started:.2f} s")
+
+    @app.cli.command("import-users")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default=None,
+                  help="Por defecto según la extensión del fichero")
+    @click.option("--batch-size", default=1000, help="Usuarios por executemany")
+    @click.option("--processes", default=None, type=int, help="Procesos para hashear contraseñas")
+    @click.option("--verified", is_flag=True, help="Marcar los emails como verificados")
+    def import_users_command(path, fmt, batch_size, processes, verified):
+        """Importa usuarios desde un CSV o NDJSON"""
+        from api.bulk_import import import_stream, detect_format, IMPORT_HASH_PROCESSES
+
+        with open(path, "rb") as f:
+            report = import_stream(f, fmt or detect_format(path), batch_size=batch_size, verified=verified,
+                                   processes=processes or IMPORT_HASH_PROCESSES, on_batch=_print_batch)
+        for error in report.errors:
+            print(f"Línea {error['line']}: {error['error']}")
+        print(f"{report.inserted} usuarios importados, {report.skipped} descartados, "
+              f"{report.verification_emails} emails de verificación en cola "
+              f"en {time.perf_counter() - report.started:.2f} s")
+
+    @app.cli.command("ingest-tracks")
+    @click.option("--tags", default="", help="Tags/moods separados por comas, p.ej. happy,chill")
+    @click.option("--pages", default=5, help="Páginas a descargar por tag")
+    @click.option("--page-size", default=200, help="Canciones por página (máx. 200)")
+    @click.option("--batch-size", default=500, help="Filas por upsert")
+    @click.option("--file", "path", type=click.Path(exists=True), default=None,
+                  help="Fichero JSON con canciones de Jamendo en vez de la API")
+    def ingest_tracks(tags, pages, page_size, batch_size, path):
+        """Carga canciones en el catálogo local mediante upserts por lotes"""
+        from api import catalog
+
+        start = time.perf_counter()
+        total = 0
+        if path:
+            with open(path) as f:
+                data = json.load(f)
+            raw_tracks = data.get("results", []) if isinstance(data, dict) else data
+            for count, seconds in catalog.upsert_tracks(raw_tracks, batch_size):
+                total += count
+                print(f"Lote de {count} canciones en {seconds * 1000:.1f} ms")
+        else:
+            for tag in [t.strip() for t in tags.split(",") if t.strip()]:
+                for page in catalog.fetch_pages(tag, pages=pages, page_size=min(page_size, 200)):
+                    for count, seconds in catalog.upsert_tracks(page, batch_size):
+                        total += count
+                        print(f"{tag}: lote de {count} canciones en {seconds * 1000:.1f} ms")
+        print(f"{total} canciones ingeridas en {time.perf_counter() - start:.2f} s")
+
+    @app.cli.command("rebuild-search-index")
+    def rebuild_search_index():
+        """Reconstruye desde cero el índice FTS5 de búsqueda"""
+        from api.search import is_fts_available, rebuild_search
+
+        if not is_fts_available():
+            print("El motor de base de datos no soporta FTS5")
+            return
+        start = time.perf_counter()
+        rebuild_search()
+        print(f"Índice de búsqueda reconstruido en {time.perf_counter() - start:.2f} s")
+
+    @app.cli.command("revoke-user-tokens")
+    @click.argument("email")
+    def revoke_user_tokens_command(email):
+        """Cierra todas las sesiones de un usuario (refresh y access vigentes)"""
+        from api.tokens import revoke_user_tokens
+
+        user = db.session.execute(db.select(User).filter_by(email=email)).scalar_one_or_none()
+        if not user:
+            print(f"No existe el usuario {email}")
+            return
+        count = revoke_user_tokens(user.id)
         db.session.commit()
-        print("All test users created")
+        print(f"{count} refresh tokens revocados para {email}")
+
+    @app.cli.command("send-outbox")
+    @click.option("--once", is_flag=True, help="Vaciar la bandeja una vez y salir")
+    @click.option("--batch-size", default=None, type=int, help="Correos por lote")
+    def send_outbox(once, batch_size):
+        """Envía la bandeja de salida de correo (usar con OUTBOX_WORKER_ENABLED=false en la web)"""
+        from api.outbox import sender, OUTBOX_POLL_SECONDS
+
+        if batch_size:
+            sender.batch_size = batch_size
+        while True:
+            start = time.perf_counter()
+            sent, failed = sender.drain()
+            if sent or failed:
+                print(f"{sent} enviados, {failed} fallidos en {time.perf_counter() - start:.2f} s")
+            if once:
+                sender.close()
+                break
+            sender.close_if_idle()
+            time.sleep(OUTBOX_POLL_SECONDS)
+
+    @app.cli.command("purge-expired")
+    @click.option("--batch-size", default=500, help="Filas por transacción")
+    @click.option("--pause", default=0.0, help="Segundos de espera entre lotes")
+    def purge_expired(batch_size, pause):
+        """Borra usuarios sin verificar antiguos, tokens caducados y correos ya enviados"""
+        from api.maintenance import purge
+
+        start = time.perf_counter()
+        total = 0
+        for name, rows, seconds in purge(batch_size=batch_size, pause=pause):
+            total += rows
+            print(f"{name}: {rows} filas en {seconds:.2f} s")
+        print(f"{total} filas eliminadas o limpiadas en {time.perf_counter() - start:.2f} s")
+
+    @app.cli.command("check-query-plans")
+    @click.option("--verbose", is_flag=True, help="Mostrar el plan completo de cada consulta")
+    def check_query_plans(verbose):
+        """Comprueba con EXPLAIN que las rutas de playlists usan índices (sale con 1 si no)"""
+        from api.query_plans import check_playlist_plans
+
+        failed = 0
+        for check in check_playlist_plans():
+            failed += not check.ok
+            print(f"{'OK  ' if check.ok else 'SCAN'} {check.route} [{check.name}]")
+            if verbose or not check.ok:
+                for line in check.plan:
+                    print(f"       {line}")
+        if failed:
+            raise SystemExit(f"{failed} consultas recorren tablas completas")
+        print("Todas las consultas de playlists usan índices")
@@ -1,28 +1,15 @@
-from flask_mail import Message
-from flask import current_app
 import os
 
-def send_verification_email(user):
-    """Envía email de verificación SIN commit automático"""
-    try:
-        mail = current_app.extensions['mail']
-        
-        token = user.verification_token
-        if not token:
-            print("No hay token generado")
-            return False
-        
-        frontend_url = os.getenv('FRONTEND_URL')
-
-        verification_url = f"{frontend_url.rstrip('/')}/verify-email?token={token}"
-        
-        msg = Message(
-            subject='Verify your email - Amuzz',
-            recipients=[user.email],
-            sender=current_app.config['MAIL_DEFAULT_SENDER']
-        )
-        
-        msg.html = f"""
+from api.outbox import enqueue_email
+
+
+def render_verification_email(user, token):
+    """Asunto y HTML del email de verificación"""
+    frontend_url = os.getenv('FRONTEND_URL')
+
+    verification_url = f"{frontend_url.rstrip('/')}/verify-email?token={token}"
+
+    html = f"""
         <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
             <h2 style="color: #333;">Verify your email address</h2>
             <p>Hi {user.full_name},</p>
@@ -44,11 +31,19 @@ def send_verification_email(user):
             </p>
         </div>
         """
-        
-        mail.send(msg)
-        print(f"Email sent successfully to {user.email}")
-        return True
-        
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        return False
\ No newline at end of file
+    return 'Verify your email - Amuzz', html
+
+
+def send_verification_email(user, token):
+    """Encola el email de verificación en la bandeja de salida SIN commit automático.
+
+    El envío real lo hace api.outbox.sender cuando el llamador hace commit, así
+    que la petición no espera al servidor SMTP.
+    """
+    if not token:
+        print("No hay token generado")
+        return False
+
+    subject, html = render_verification_email(user, token)
+    enqueue_email(user.email, subject, html)
+    return True
@@ -0,0 +1,97 @@
+"""
+Caché de identidades para las rutas protegidas con JWT.
+
+Guarda un Principal ligero por usuario (no la fila entera) en dos niveles: por
+petición en `flask.g` y por proceso en un LRU con TTL corto. Los cambios hechos
+con el ORM sobre User invalidan la entrada automáticamente; si se actualizan
+usuarios con SQL directo hay que llamar a invalidate_principal().
+"""
+import os
+from collections import namedtuple
+from functools import wraps
+
+from flask import g, jsonify, has_app_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import event, select
+
+from api.cache import ResponseCache
+from api.models import db, User
+
+Principal = namedtuple(
+    "Principal", ["id", "email", "username", "full_name", "email_verified", "is_premium", "is_admin"]
+)
+
+principal_cache = ResponseCache(
+    max_entries=int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", 10000)),
+    max_bytes=int(os.getenv("PRINCIPAL_CACHE_MAX_BYTES", 8 * 1024 * 1024)),
+    ttl=int(os.getenv("PRINCIPAL_CACHE_TTL", 30)),
+    stale_ttl=0,
+)
+
+
+def _fetch_principal(user_id):
+    row = db.session.execute(
+        select(User.id, User.email, User.username, User.full_name,
+               User.email_verified, User.is_premium, User.is_admin).where(User.id == user_id)
+    ).first()
+    return Principal(*row) if row else None
+
+
+def load_principal(user_id):
+    """Principal del usuario o None si no existe"""
+    request_cache = g.setdefault("_principals", {})
+    if user_id in request_cache:
+        return request_cache[user_id]
+
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        principal = _fetch_principal(user_id)
+        if principal is not None:
+            principal_cache.set(user_id, principal, size=256)
+    request_cache[user_id] = principal
+    return principal
+
+
+def current_principal():
+    """Principal del token de la petición actual (requiere jwt_required)"""
+    identity = get_jwt_identity()
+    try:
+        user_id = int(identity)
+    except (TypeError, ValueError):
+        return None
+    return load_principal(user_id)
+
+
+def invalidate_principal(user_id):
+    principal_cache.delete(user_id)
+    if has_app_context():
+        g.get("_principals", {}).pop(user_id, None)
+
+
+def user_required(fn):
+    """jwt_required + comprobar que el usuario existe, sin cargar la fila User"""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if current_principal() is None:
+            return jsonify({"error": "Usuario no encontrado"}), 404
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def admin_required(fn):
+    """Como user_required, pero además exige User.is_admin"""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        principal = current_principal()
+        if principal is None or not principal.is_admin:
+            return jsonify({"msg": "Acceso denegado"}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_change(mapper, connection, target):
+    invalidate_principal(target.id)
@@ -0,0 +1,157 @@
+"""
+Cliente HTTP compartido para la API de Jamendo: sesión keep-alive con pool de
+conexiones, timeouts, reintentos con jitter y circuit breaker
+"""
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+JAMENDO_API_URL = os.getenv("JAMENDO_API_URL", "https://api.jamendo.com/v3.0").rstrip("/")
+JAMENDO_CLIENT_ID = os.getenv("JAMENDO_CLIENT_ID", "64b5cce9")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class JamendoError(Exception):
+    pass
+
+
+class CircuitOpenError(JamendoError):
+    pass
+
+
+class CircuitBreaker:
+    """Abre el circuito tras `failure_threshold` fallos seguidos.
+
+    Mientras está abierto las llamadas fallan al instante. Pasado `reset_timeout`
+    deja pasar una única llamada de prueba (half-open) que decide si se cierra.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures}
+
+
+class JamendoClient:
+    def __init__(self, base_url=JAMENDO_API_URL, client_id=JAMENDO_CLIENT_ID,
+                 pool_size=20, connect_timeout=3.05, read_timeout=10,
+                 max_retries=2, backoff=0.3, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.client_id = client_id
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _sleep_before_retry(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = min(float(retry_after), self.timeout[1])
+        else:
+            # Full jitter: aleatorio entre 0 y backoff * 2^intento
+            delay = random.uniform(0, self.backoff * (2 ** attempt))
+        time.sleep(delay)
+
+    def get(self, path, params=None):
+        """GET a la API de Jamendo, devuelve el JSON ya parseado"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("Jamendo no disponible temporalmente")
+
+        params = dict(params or {})
+        params.setdefault("client_id", self.client_id)
+        params.setdefault("format", "json")
+        url = f"{self.base_url}/{path.lstrip('/')}"
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code == 200:
+                    data = response.json()
+                    self.breaker.record_success()
+                    return data
+                last_error = JamendoError(f"Jamendo respondió {response.status_code}")
+                if response.status_code not in RETRY_STATUSES:
+                    # Un 4xx no indica que Jamendo esté caído
+                    self.breaker.record_success()
+                    raise last_error
+            except (requests.RequestException, ValueError) as e:
+                # Cualquier fallo de requests (también ChunkedEncodingError, TooManyRedirects...)
+                # tiene que llegar a record_failure o el intento half-open no se libera
+                last_error = JamendoError(f"Error al conectar con Jamendo: {e}")
+            if attempt < self.max_retries:
+                self._sleep_before_retry(attempt, response)
+
+        self.breaker.record_failure()
+        raise last_error
+
+    def tracks(self, **params):
+        return self.get("tracks", params).get("results", [])
+
+    def stats(self):
+        return {"base_url": self.base_url, "breaker": self.breaker.stats()}
+
+
+client = JamendoClient(
+    pool_size=int(os.getenv("JAMENDO_POOL_SIZE", 20)),
+    connect_timeout=float(os.getenv("JAMENDO_CONNECT_TIMEOUT", 3.05)),
+    read_timeout=float(os.getenv("JAMENDO_READ_TIMEOUT", 10)),
+    max_retries=int(os.getenv("JAMENDO_MAX_RETRIES", 2)),
+    backoff=float(os.getenv("JAMENDO_RETRY_BACKOFF", 0.3)),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("JAMENDO_BREAKER_THRESHOLD", 5)),
+        reset_timeout=float(os.getenv("JAMENDO_BREAKER_RESET", 30)),
+    ),
+)
@@ -0,0 +1,84 @@
+"""
+Limpieza periódica de la base de datos por lotes pequeños.
+
+Cada lote es una transacción corta (se seleccionan hasta `batch_size` ids y se
+borran o actualizan sólo esos), de modo que ni SQLite ni Postgres mantienen un
+bloqueo largo sobre `user` mientras la app sigue sirviendo peticiones.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, update
+
+from api.models import db, User, EmailOutbox, RefreshToken, RevokedToken
+
+UNVERIFIED_USER_DAYS = int(os.getenv("UNVERIFIED_USER_DAYS", 7))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", 7))
+
+
+def _in_batches(id_column, condition, statement, batch_size, pause):
+    """Aplica `statement` a los ids que cumplen `condition`, lote a lote. Devuelve filas afectadas"""
+    total = 0
+    while True:
+        ids = db.session.execute(
+            select(id_column).where(condition).order_by(id_column).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return total
+        result = db.session.execute(
+            statement.where(id_column.in_(ids)).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        total += result.rowcount
+        if len(ids) < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
+
+
+def purge_unverified_users(batch_size=500, pause=0, days=UNVERIFIED_USER_DAYS):
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=days)
+    # Una cuenta antigua a la que se le acaba de reenviar el correo conserva su enlace hasta que caduque
+    token_expired = User.verification_token_expires.is_(None) | (User.verification_token_expires < now)
+    condition = (User.email_verified == db.false()) & (User.created_at < cutoff) & token_expired
+    return _in_batches(User.id, condition, delete(User), batch_size, pause)
+
+
+def clear_expired_verification_tokens(batch_size=500, pause=0):
+    condition = User.verification_token_expires < datetime.utcnow()
+    statement = update(User).values(verification_token_hash=None, verification_token_expires=None)
+    return _in_batches(User.id, condition, statement, batch_size, pause)
+
+
+def purge_expired_session_tokens(batch_size=500, pause=0):
+    now = datetime.utcnow()
+    refresh = _in_batches(RefreshToken.jti, RefreshToken.expires_at < now, delete(RefreshToken), batch_size, pause)
+    revoked = _in_batches(RevokedToken.id, RevokedToken.expires_at < now, delete(RevokedToken), batch_size, pause)
+    return refresh + revoked
+
+
+def purge_outbox(batch_size=500, pause=0, days=OUTBOX_RETENTION_DAYS):
+    # Los correos enviados llevan enlaces de verificación en claro
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    condition = EmailOutbox.status.in_(("sent", "failed")) & (EmailOutbox.created_at < cutoff)
+    return _in_batches(EmailOutbox.id, condition, delete(EmailOutbox), batch_size, pause)
+
+
+PURGE_STEPS = [
+    ("unverified_users", purge_unverified_users),
+    ("verification_tokens", clear_expired_verification_tokens),
+    ("session_tokens", purge_expired_session_tokens),
+    ("email_outbox", purge_outbox),
+]
+
+
+def purge(batch_size=500, pause=0):
+    """Ejecuta todas las limpiezas. Devuelve [(paso, filas, segundos)]"""
+    report = []
+    for name, step in PURGE_STEPS:
+        start = time.perf_counter()
+        rows = step(batch_size=batch_size, pause=pause)
+        report.append((name, rows, time.perf_counter() - start))
+    return report
@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import String, Date, ForeignKey
-from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase, relationship
+from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase, relationship, deferred, synonym
 from datetime import datetime, timedelta
+import hashlib
+import json
 import secrets
 
 
@@ -12,6 +14,17 @@ class Base(DeclarativeBase):
 db = SQLAlchemy(model_class=Base)
 
 
+def hash_verification_token(token):
+    """Sólo se guarda el SHA-256 del token; el token en claro viaja en el email"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def new_verification_token():
+    """(token en claro, hash, caducidad) para un email de verificación"""
+    token = secrets.token_urlsafe(32)
+    return token, hash_verification_token(token), datetime.utcnow() + timedelta(hours=24)
+
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     full_name = db.Column(db.String(120), nullable=False)
@@ -20,8 +33,17 @@ class User(db.Model):
     date_of_birth = db.Column(db.Date, nullable=True)
     password_hash = db.Column(db.String(200), nullable=False)
     email_verified = db.Column(db.Boolean, default=False, nullable=False)
-    verification_token = db.Column(db.String(100), unique=True, nullable=True)
-    verification_token_expires = db.Column(db.DateTime, nullable=True)
+    is_premium = db.Column(db.Boolean, default=False, server_default=db.false(), nullable=False)
+    is_admin = db.Column(db.Boolean, default=False, server_default=db.false(), nullable=False)
+    verification_token_hash = db.Column(db.String(64), unique=True, index=True, nullable=True)
+    verification_token_expires = db.Column(db.DateTime, nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.now(), nullable=False)
+    # Se incrementa con cada cambio en sus playlists; ETag de GET /api/playlists
+    playlists_version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_user_email_verified_created_at', 'email_verified', 'created_at'),
+    )
 
     def __repr__(self):
         return f"User(username={self.username!r}, email={self.email!r})"
@@ -37,20 +59,21 @@ class User(db.Model):
         }
 
     def generate_verification_token(self):
-        """Genera un token único para verificación de email"""
-        self.verification_token = secrets.token_urlsafe(32)
-        self.verification_token_expires = datetime.utcnow() + timedelta(hours=24)
+        """Genera un token único para verificación de email y devuelve el token en claro"""
+        token, self.verification_token_hash, self.verification_token_expires = new_verification_token()
         
-        return self.verification_token
+        return token
     
     def verify_email(self, token):
         """Verifica el email si el token es válido"""
         try:
-            if (self.verification_token == token and
-                self.verification_token_expires and
-                self.verification_token_expires > datetime.utcnow()):
+            token_matches = bool(self.verification_token_hash) and secrets.compare_digest(
+                self.verification_token_hash, hash_verification_token(token)
+            )
+            still_valid = bool(self.verification_token_expires) and self.verification_token_expires > datetime.utcnow()
+            if token_matches and still_valid:
                 self.email_verified = True
-                self.verification_token = None
+                self.verification_token_hash = None
                 self.verification_token_expires = None
                 return True
             return False
@@ -61,47 +84,159 @@ class User(db.Model):
 
 class Playlist(db.Model):
     __tablename__ = 'playlists'
+    __table_args__ = (
+        # Listado de las playlists de un usuario, ya en orden de id
+        db.Index('ix_playlists_user_id_id', 'user_id', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     description = db.Column(db.String(250))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, ForeignKey('user.id'), nullable=False)
+    # Se incrementa con cada cambio en la playlist o sus canciones; ETag de sus GET
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
 
     user = relationship('User', backref=db.backref('playlists', lazy=True))
 
-    songs = db.relationship('PlaylistSong', backref='playlist', cascade="all, delete-orphan")
+    songs = db.relationship('PlaylistSong', backref='playlist', cascade="all, delete-orphan",
+                            order_by='[PlaylistSong.position, PlaylistSong.id]')
 
 class PlaylistSong(db.Model):
+    """Entrada de una playlist; los datos de la canción viven una sola vez en `tracks`"""
     __tablename__ = 'playlist_songs'
+    __table_args__ = (
+        # Una canción aparece una sola vez por playlist; también sirve para buscarla
+        db.UniqueConstraint('playlist_id', 'track_id', name='uq_playlist_songs_playlist_id_track_id'),
+        # Canciones de una playlist en orden, y la última posición para añadir al final
+        db.Index('ix_playlist_songs_playlist_id_position', 'playlist_id', 'position'),
+        # Playlists que contienen una canción del catálogo que ha cambiado
+        db.Index('ix_playlist_songs_track_id', 'track_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     playlist_id = db.Column(db.Integer, ForeignKey(
         'playlists.id'), nullable=False)
-    song_id = db.Column(db.String(50), nullable=False)
+    track_id = db.Column(db.String(50), ForeignKey('tracks.id'), nullable=False)
+    position = db.Column(db.String(64), nullable=False)  # clave ordenable, ver api/positions.py
+    added_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    track = relationship('Track', lazy='joined', innerjoin=True)
+
+    # Nombre histórico del id externo en la API y en las consultas
+    song_id = synonym('track_id')
+
+    def serialize(self):
+        track = self.track
+        return {
+            "id": self.id,
+            "playlist_id": self.playlist_id,
+            "song_id": self.track_id,
+            "position": self.position,
+            "name": track.name,
+            "artist": track.artist,
+            "audio_url": track.audio_url,
+            "image_url": track.image_url,
+            "license_url": track.license_url,
+            "genre": track.genre_json(),
+            "duration": track.duration,
+            "release_date": track.release_date.isoformat() if track.release_date else None,
+            "added_at": self.added_at.isoformat()
+        }
+
+class Track(db.Model):
+    """Catálogo local de canciones de Jamendo"""
+    __tablename__ = 'tracks'
+
+    id = db.Column(db.String(50), primary_key=True)  # id de Jamendo
     name = db.Column(db.String, nullable=False)
     artist = db.Column(db.String, nullable=False)
     audio_url = db.Column(db.String, nullable=False)
     image_url = db.Column(db.String, nullable=True)
     license_url = db.Column(db.String, nullable=True)
-    added_at = db.Column(db.DateTime, default=datetime.utcnow)
-    genre = db.Column(db.String, nullable=True)  
-    duration = db.Column(db.Integer, nullable=True)  
+    duration = db.Column(db.Integer, nullable=True)
+    album_name = db.Column(db.String, nullable=True)
     release_date = db.Column(db.Date, nullable=True)
+    genres = db.Column(db.JSON, nullable=True)
+    waveform = deferred(db.Column(db.Text, nullable=True))  # sólo para /waveform
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    tags = db.relationship('TrackTag', backref='track', cascade="all, delete-orphan")
 
-    
     def serialize(self):
         return {
             "id": self.id,
-            "playlist_id": self.playlist_id,
-            "song_id": self.song_id,
             "name": self.name,
             "artist": self.artist,
-            "audio_url": self.audio_url,
-            "image_url": self.image_url,
-            "license_url": self.license_url,
-            "genre": self.genre,  
-            "duration": self.duration,  
+            "audio": self.audio_url,
+            "image": self.image_url,
+            "license": self.license_url,
+            "duration": self.duration,
+            "album_name": self.album_name,
             "release_date": self.release_date.isoformat() if self.release_date else None,
-            "added_at": self.added_at.isoformat()
-        }
\ No newline at end of file
+            "genres": self.genres or [],
+        }
+
+    def genre_json(self):
+        """Géneros como los guarda el frontend en playlists: lista JSON compacta o None"""
+        if not self.genres:
+            return None
+        return json.dumps(self.genres, separators=(",", ":"), ensure_ascii=False)
+
+
+class TrackTag(db.Model):
+    """Tags de Jamendo (géneros, moods, instrumentos) indexados por valor"""
+    __tablename__ = 'track_tags'
+    __table_args__ = (
+        db.Index('ix_track_tags_tag_kind', 'tag', 'kind', 'track_id'),
+    )
+
+    track_id = db.Column(db.String(50), ForeignKey('tracks.id', ondelete='CASCADE'), primary_key=True)
+    tag = db.Column(db.String(80), primary_key=True)
+    kind = db.Column(db.String(20), primary_key=True)  # genre | vartag | instrument
+
+
+class RefreshToken(db.Model):
+    """Refresh tokens emitidos; cada rotación crea uno nuevo en la misma familia"""
+    __tablename__ = 'refresh_tokens'
+
+    jti = db.Column(db.String(36), primary_key=True)
+    family = db.Column(db.String(36), nullable=False, index=True)
+    user_id = db.Column(db.Integer, ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    access_jti = db.Column(db.String(36), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    used_at = db.Column(db.DateTime, nullable=True)
+    revoked_at = db.Column(db.DateTime, nullable=True)
+
+
+class RevokedToken(db.Model):
+    """JTIs revocados; `revoked_at` permite sincronizar el índice en memoria por incrementos"""
+    __tablename__ = 'revoked_tokens'
+
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class EmailOutbox(db.Model):
+    """Correos pendientes; se escriben en la misma transacción que el cambio que los origina"""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending | sending | sent | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    claimed_by = db.Column(db.String(32), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
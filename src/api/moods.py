@@ -0,0 +1,136 @@
+"""
+Índice en memoria de moods y tags canónicos.
+
+Resuelve lo que escribe el usuario ("Happy ", "hapy", "feliz") a un único
+conjunto de tags antes de consultar el catálogo, la caché o Jamendo, para que
+todas las variantes compartan clave de caché. Se carga una vez al importar el
+módulo desde data/moods.json (o MOODS_FILE).
+"""
+import json
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+MOODS_FILE = os.getenv(
+    "MOODS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "moods.json")
+)
+
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+
+
+def normalize(text):
+    """Minúsculas, sin acentos ni signos y con espacios simples"""
+    text = unicodedata.normalize("NFKD", str(text).casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _NON_WORD.sub(" ", text.replace("-", " "))
+    return " ".join(text.split())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein con corte: devuelve limit + 1 en cuanto se pasa del límite"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class Resolution:
+    __slots__ = ("key", "tags", "exact")
+
+    def __init__(self, key, tags, exact):
+        self.key = key
+        self.tags = tuple(tags)
+        self.exact = exact
+
+    @property
+    def fuzzytags(self):
+        return " ".join(self.tags)
+
+    def to_dict(self):
+        return {"key": self.key, "tags": list(self.tags), "exact": self.exact}
+
+
+class MoodIndex:
+    def __init__(self, moods, tags=()):
+        self.aliases = {}  # alias normalizado -> (clave canónica, tags)
+        for key, spec in moods.items():
+            entry = (key, tuple(normalize(t) for t in spec.get("tags") or [key]))
+            for alias in [key, *spec.get("tags", []), *spec.get("synonyms", [])]:
+                self.aliases.setdefault(normalize(alias), entry)
+        for tag in tags:
+            tag = normalize(tag)
+            self.aliases.setdefault(tag, (tag, (tag,)))
+
+        self._trigram_index = {}
+        for alias in self.aliases:
+            for gram in trigrams(alias):
+                self._trigram_index.setdefault(gram, set()).add(alias)
+
+    @classmethod
+    def load(cls, path=MOODS_FILE):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("moods", {}), data.get("tags", []))
+
+    def _closest(self, term):
+        """Alias más parecido a `term` usando trigramas como filtro y Levenshtein"""
+        limit = 1 if len(term) <= 5 else 2
+        counts = {}
+        for gram in trigrams(term):
+            for alias in self._trigram_index.get(gram, ()):
+                counts[alias] = counts.get(alias, 0) + 1
+        best, best_distance = None, limit + 1
+        # Sólo los candidatos con más trigramas en común
+        for alias in sorted(counts, key=counts.get, reverse=True)[:20]:
+            distance = edit_distance(term, alias, limit)
+            if distance < best_distance or (distance == best_distance and best and alias < best):
+                best, best_distance = alias, distance
+        return best
+
+    def _lookup(self, term):
+        if term in self.aliases:
+            return self.aliases[term], True
+        alias = self._closest(term)
+        if alias is not None:
+            return self.aliases[alias], False
+        return None, False
+
+    def resolve(self, text):
+        term = normalize(text)
+        if not term:
+            return None
+        entry, exact = self._lookup(term)
+        if entry is not None:
+            return Resolution(entry[0], entry[1], exact)
+
+        # Varias palabras: resolvemos cada una y unimos los tags
+        keys, tags, all_exact = [], [], True
+        for word in term.split():
+            entry, exact = self._lookup(word)
+            key, word_tags = entry if entry is not None else (word, (word,))
+            all_exact = all_exact and exact
+            if key not in keys:
+                keys.append(key)
+            tags.extend(t for t in word_tags if t not in tags)
+        return Resolution(" ".join(keys), tags, all_exact)
+
+
+index = MoodIndex.load()
+
+
+@lru_cache(maxsize=4096)
+def resolve(text):
+    return index.resolve(text)
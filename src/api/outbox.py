@@ -0,0 +1,213 @@
+"""
+Bandeja de salida de correo (patrón outbox).
+
+Las vistas sólo insertan una fila en `email_outbox` dentro de su transacción;
+un hilo en segundo plano (o `flask send-outbox` en un proceso aparte) la vacía
+por lotes reutilizando una única conexión SMTP. Los fallos se reintentan con
+backoff exponencial hasta OUTBOX_MAX_ATTEMPTS, y una fila reclamada por un
+worker que murió vuelve a estar disponible tras OUTBOX_CLAIM_TIMEOUT.
+
+El hilo sólo lo arrancan los puntos de entrada que sirven la web (wsgi.py,
+`python app.py` o la primera petición con `flask run`); importar la app desde
+un comando `flask ...` no lo pone en marcha. Con varios procesos web conviene
+poner OUTBOX_WORKER_ENABLED=false y arrancar un único `flask send-outbox`; aun
+así el reclamo por lotes es seguro con varios emisores a la vez.
+"""
+import os
+import random
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask_mail import Message
+from sqlalchemy import event, select, update, or_, and_
+from sqlalchemy.orm import Session
+
+from api.models import db, EmailOutbox
+
+OUTBOX_WORKER_ENABLED = os.getenv("OUTBOX_WORKER_ENABLED", "true").lower() == "true"
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", 5))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", 30))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", 3600))
+OUTBOX_CLAIM_TIMEOUT = timedelta(seconds=int(os.getenv("OUTBOX_CLAIM_TIMEOUT", 300)))
+# Cerrar la conexión SMTP tras este tiempo sin nada que enviar
+OUTBOX_IDLE_CLOSE_SECONDS = float(os.getenv("OUTBOX_IDLE_CLOSE_SECONDS", 60))
+
+# Errores tras los que merece la pena reconectar y reintentar en el momento
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+def enqueue_email(recipient, subject, html):
+    """Añade el correo a la sesión actual; se envía cuando el llamador haga commit"""
+    message = EmailOutbox(recipient=recipient, subject=subject, html=html)
+    db.session.add(message)
+    db.session.info["outbox_pending"] = True
+    return message
+
+
+def backoff_delay(attempts):
+    delay = min(OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class OutboxSender:
+    def __init__(self, batch_size=OUTBOX_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.app = None
+        self.worker_id = uuid.uuid4().hex
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        # La conexión SMTP no es thread-safe: conectar, enviar y cerrar van siempre bajo este lock
+        self._smtp_lock = threading.RLock()
+        self._thread = None
+        self._connection = None
+        self._last_used = 0.0
+        self.sent = 0
+        self.failed = 0
+
+    def init_app(self, app, start=False):
+        self.app = app
+        if start:
+            self.start()
+
+    def start(self):
+        """Arranca el hilo emisor si no está ya en marcha"""
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(OUTBOX_POLL_SECONDS)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.drain()
+            except Exception as e:
+                print(f"Error enviando la bandeja de salida: {e}")
+            self.close_if_idle()
+
+    # Conexión SMTP persistente
+
+    def _connect(self):
+        with self._smtp_lock:
+            if self._connection is None:
+                mail = self.app.extensions["mail"]
+                self._connection = mail.connect().__enter__()
+            return self._connection
+
+    def close_if_idle(self):
+        with self._smtp_lock:
+            if self._connection is not None and time.monotonic() - self._last_used > OUTBOX_IDLE_CLOSE_SECONDS:
+                self.close()
+
+    def close(self):
+        with self._smtp_lock:
+            connection, self._connection = self._connection, None
+            if connection is not None and connection.host is not None:
+                try:
+                    connection.host.quit()
+                except Exception:
+                    pass
+
+    def _send(self, row):
+        message = Message(
+            subject=row.subject,
+            recipients=[row.recipient],
+            html=row.html,
+            sender=self.app.config["MAIL_DEFAULT_SENDER"],
+        )
+        with self._smtp_lock:
+            try:
+                self._connect().send(message)
+            except CONNECTION_ERRORS:
+                # El servidor cerró la conexión reutilizada: una reconexión y un reintento
+                self.close()
+                self._connect().send(message)
+            self._last_used = time.monotonic()
+
+    # Bandeja
+
+    def _claim(self):
+        now = datetime.utcnow()
+        available = or_(
+            and_(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now),
+            and_(EmailOutbox.status == "sending", EmailOutbox.claimed_at < now - OUTBOX_CLAIM_TIMEOUT),
+        )
+        ids = select(EmailOutbox.id).where(available).order_by(EmailOutbox.id).limit(self.batch_size)
+        claim = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"
+        db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(ids.scalar_subquery()), available)
+            .values(status="sending", claimed_by=claim, claimed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return db.session.execute(
+            select(EmailOutbox).where(EmailOutbox.claimed_by == claim, EmailOutbox.status == "sending")
+            .order_by(EmailOutbox.id)
+        ).scalars().all()
+
+    def send_batch(self):
+        """Envía un lote. Devuelve (enviados, fallidos, reclamados)"""
+        rows = self._claim()
+        sent = failed = 0
+        for row in rows:
+            try:
+                self._send(row)
+            except Exception as e:
+                self.close()
+                row.attempts += 1
+                row.last_error = str(e)[:1000]
+                if row.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    row.status = "failed"
+                else:
+                    row.status = "pending"
+                    row.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_delay(row.attempts))
+                failed += 1
+            else:
+                row.status = "sent"
+                row.sent_at = datetime.utcnow()
+                row.attempts += 1
+                sent += 1
+        if rows:
+            db.session.commit()
+        self.sent += sent
+        self.failed += failed
+        return sent, failed, len(rows)
+
+    def drain(self):
+        """Vacía todo lo que esté listo para enviarse. Devuelve (enviados, fallidos)"""
+        total_sent = total_failed = 0
+        while True:
+            sent, failed, claimed = self.send_batch()
+            total_sent += sent
+            total_failed += failed
+            if claimed < self.batch_size:
+                return total_sent, total_failed
+
+    def stats(self):
+        return {"sent": self.sent, "failed": self.failed, "connected": self._connection is not None}
+
+
+sender = OutboxSender()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_sender(session):
+    if session.info.pop("outbox_pending", False):
+        sender.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("outbox_pending", None)
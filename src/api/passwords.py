@@ -0,0 +1,70 @@
+"""
+Hash de contraseñas fuera del hilo de la petición.
+
+El KDF (scrypt/pbkdf2) se ejecuta en un pool de hilos acotado (hashlib libera
+el GIL mientras calcula). Si ya hay demasiados hashes en marcha o en cola se
+rechaza al momento con PasswordHasherBusy (503) en vez de bloquear el worker.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from api.utils import APIException
+
+# Formato de werkzeug, p.ej. "scrypt:32768:8:1" o "pbkdf2:sha256:600000"
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 16))
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+
+
+class PasswordHasherBusy(APIException):
+    status_code = 503
+
+    def __init__(self, message="Servidor ocupado, inténtalo de nuevo en unos segundos"):
+        super().__init__(message)
+
+
+class PasswordHasher:
+    def __init__(self, method=PASSWORD_HASH_METHOD, workers=PASSWORD_HASH_WORKERS,
+                 queue_size=PASSWORD_HASH_QUEUE, timeout=PASSWORD_HASH_TIMEOUT):
+        self.method = method
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._method_prefix = None
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = self._pool.submit(fn, *args)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise PasswordHasherBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    @property
+    def method_prefix(self):
+        """Prefijo que genera el método configurado, con los parámetros por defecto resueltos"""
+        if self._method_prefix is None:
+            self._method_prefix = generate_password_hash("", self.method).split("$", 1)[0]
+        return self._method_prefix
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split("$", 1)[0] != self.method_prefix
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,190 @@
+"""
+Posiciones de las canciones en una playlist como claves ordenables.
+
+Cada entrada guarda en `position` una fracción en base 36 escrita como texto
+("i", "i4", "j"...). El orden es el orden lexicográfico de esas cadenas, así
+que siempre cabe una clave entre dos vecinas y mover una canción sólo
+reescribe su fila. Sólo se usan dígitos y minúsculas para que el orden sea el
+mismo con cualquier collation.
+
+Las claves crecen cuando se inserta muchas veces en el mismo hueco; si una
+supera POSITION_MAX_LENGTH se reparte de nuevo toda la playlist (`rebalance`).
+Lo mismo si un movimiento encuentra dos entradas con la misma posición, que
+sólo puede venir de datos antiguos o de escrituras concurrentes.
+"""
+import os
+
+from sqlalchemy import update
+
+from api.models import db, Playlist, PlaylistSong
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+FIRST_KEY = DIGITS[BASE // 2]
+APPEND_WIDTH = 4
+POSITION_MAX_LENGTH = int(os.getenv("PLAYLIST_POSITION_MAX_LENGTH", 32))
+
+
+def _midpoint(a, b):
+    """Clave estrictamente entre a y b (b=None es el final). Ninguna acaba en '0'"""
+    if b is not None:
+        n = 0
+        while (a[n] if n < len(a) else "0") == b[n]:
+            n += 1
+        if n:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else BASE
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def _encode(value, width):
+    digits = []
+    for _ in range(width):
+        value, digit = divmod(value, BASE)
+        digits.append(DIGITS[digit])
+    return "".join(reversed(digits)).rstrip("0")
+
+
+def key_after(key):
+    """Clave para añadir al final: suma una unidad con al menos APPEND_WIDTH dígitos.
+
+    Así una playlist admite cientos de miles de canciones añadidas al final
+    sin que crezcan las claves.
+    """
+    if not key:
+        return FIRST_KEY
+    width = max(len(key), APPEND_WIDTH)
+    value = int(key.ljust(width, "0"), BASE) + 1
+    if value >= BASE ** width:
+        return key + DIGITS[1]
+    return _encode(value, width)
+
+
+def key_between(before, after):
+    """Clave entre dos posiciones; None significa el principio o el final"""
+    if after is None:
+        return key_after(before)
+    if before is not None and before >= after:
+        raise ValueError(f"Posiciones desordenadas: {before!r} >= {after!r}")
+    return _midpoint(before or "", after)
+
+
+def spaced_keys(count):
+    """`count` claves repartidas por la mitad inferior del rango.
+
+    La mitad superior queda libre para lo que se añada después al final.
+    """
+    width = APPEND_WIDTH
+    while BASE ** width < 4 * (count + 1):
+        width += 1
+    step = BASE ** width // (2 * (count + 1))
+    return [_encode(i * step, width) for i in range(1, count + 1)]
+
+
+def last_position_query(playlist_id):
+    return db.select(db.func.max(PlaylistSong.position)).where(PlaylistSong.playlist_id == playlist_id)
+
+
+def last_position(playlist_id):
+    return db.session.execute(last_position_query(playlist_id)).scalar()
+
+
+def rebalance(playlist_id):
+    """Reparte de nuevo las posiciones de la playlist conservando el orden. No hace commit"""
+    entry_ids = db.session.execute(
+        db.select(PlaylistSong.id)
+        .where(PlaylistSong.playlist_id == playlist_id)
+        .order_by(PlaylistSong.position, PlaylistSong.id)
+    ).scalars().all()
+    if entry_ids:
+        db.session.execute(update(PlaylistSong), [
+            {"id": entry_id, "position": key}
+            for entry_id, key in zip(entry_ids, spaced_keys(len(entry_ids)))
+        ])
+    return len(entry_ids)
+
+
+def lock_playlist(playlist_id):
+    """Bloquea la fila de la playlist hasta el commit para serializar las altas (no-op en SQLite)"""
+    db.session.execute(db.select(Playlist.id).where(Playlist.id == playlist_id).with_for_update())
+
+
+def append_position(playlist_id):
+    """Posición para añadir al final de la playlist.
+
+    Bloquea antes la playlist: dos altas simultáneas leerían el mismo máximo y
+    guardarían la misma posición.
+    """
+    lock_playlist(playlist_id)
+    key = key_after(last_position(playlist_id))
+    if len(key) > POSITION_MAX_LENGTH:
+        rebalance(playlist_id)
+        key = key_after(last_position(playlist_id))
+    return key
+
+
+def _gap(playlist_id, entry_id, anchor_id, after):
+    """(anterior, siguiente) del hueco junto a `anchor_id`, sin contar la propia entrada"""
+    anchor = anchor_position(playlist_id, anchor_id)
+    neighbour = db.session.execute(neighbour_query(playlist_id, entry_id, anchor, after)).scalar()
+    return (anchor, neighbour) if after else (neighbour, anchor)
+
+
+def anchor_position(playlist_id, anchor_id):
+    """Posición de la entrada de referencia (None si no hay); LookupError si no está en la playlist"""
+    if anchor_id is None:
+        return None
+    anchor = db.session.execute(
+        db.select(PlaylistSong.position).filter_by(id=anchor_id, playlist_id=playlist_id)
+    ).scalar_one_or_none()
+    if anchor is None:
+        raise LookupError(anchor_id)
+    return anchor
+
+
+def has_ties(playlist_id, entry_id, anchor_id):
+    """¿Comparte otra entrada la posición del ancla? Entonces no hay hueco entre ellas"""
+    anchor = anchor_position(playlist_id, anchor_id)
+    if anchor is None:
+        return False
+    return db.session.execute(
+        db.select(PlaylistSong.id)
+        .where(PlaylistSong.playlist_id == playlist_id, PlaylistSong.position == anchor,
+               PlaylistSong.id.not_in((entry_id, anchor_id)))
+        .limit(1)
+    ).first() is not None
+
+
+def neighbour_query(playlist_id, entry_id, anchor, after):
+    """Posición vecina de `anchor` por detrás (after) o por delante, sin contar la propia entrada"""
+    others = (PlaylistSong.playlist_id == playlist_id, PlaylistSong.id != entry_id)
+    if after:
+        # Detrás del ancla (o al principio): la primera posición mayor es el límite
+        query = db.select(db.func.min(PlaylistSong.position)).where(*others)
+        return query if anchor is None else query.where(PlaylistSong.position > anchor)
+    query = db.select(db.func.max(PlaylistSong.position)).where(*others)
+    return query if anchor is None else query.where(PlaylistSong.position < anchor)
+
+
+def move_position(playlist_id, entry_id, anchor_id, after=True):
+    """Nueva posición para colocar la entrada detrás (after) o delante de `anchor_id`.
+
+    anchor_id=None es el principio (after) o el final (not after). Si el ancla
+    empata con otra entrada, las vecinas están desordenadas o la clave sale
+    demasiado larga, se reparte antes la playlist. LookupError si el ancla no
+    está en la playlist. No hace commit.
+    """
+    gap = _gap(playlist_id, entry_id, anchor_id, after)
+    if has_ties(playlist_id, entry_id, anchor_id) or (None not in gap and gap[0] >= gap[1]):
+        rebalance(playlist_id)
+        gap = _gap(playlist_id, entry_id, anchor_id, after)
+    key = key_between(*gap)
+    if len(key) > POSITION_MAX_LENGTH:
+        rebalance(playlist_id)
+        key = key_between(*_gap(playlist_id, entry_id, anchor_id, after))
+    return key
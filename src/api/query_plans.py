@@ -0,0 +1,81 @@
+"""
+Comprobación de los planes de consulta de las rutas de playlists.
+
+Cada consulta de `routes.py` sobre playlists se construye aquí con los mismos
+helpers que usa la ruta, con valores de ejemplo, y se pasa por EXPLAIN. Un recorrido completo de una tabla (SCAN en
+SQLite, Seq Scan en PostgreSQL) cuenta como fallo: significa que falta el
+índice que esa ruta necesita. `flask check-query-plans` sale con error si
+alguna falla.
+"""
+from collections import namedtuple
+
+from sqlalchemy import text, update
+
+from api.models import db, Playlist, PlaylistSong
+from api.positions import last_position_query, neighbour_query
+from api.versions import playlists_containing
+
+PlanCheck = namedtuple("PlanCheck", "route name plan ok")
+
+
+def playlist_queries(user_id=1, playlist_id=1, entry_ids=(1, 2), song_ids=("1", "2")):
+    """(ruta, consulta, sentencia) construidas con los mismos helpers que usan las rutas"""
+    from api.routes import (
+        playlist_overview, playlists_version_query, playlist_version_query, playlist_songs_query,
+        playlist_entry_query, existing_songs_query, delete_entries_statement,
+    )
+
+    # Carga selectin de Playlist.songs: un IN por las playlists de la página, con el orden de la relación
+    selectin_songs = (
+        db.select(PlaylistSong).where(PlaylistSong.playlist_id.in_([playlist_id]))
+        .order_by(*Playlist.songs.property.order_by)
+    )
+    return [
+        ("GET /playlists", "version", playlists_version_query(user_id)),
+        ("GET /playlists", "overview", playlist_overview(user_id)),
+        ("GET /playlists", "songs (selectin)", selectin_songs),
+        ("GET /playlists/<id>", "overview", playlist_overview(user_id).where(Playlist.id == playlist_id)),
+        ("GET /playlists/<id>/songs", "version", playlist_version_query(playlist_id, user_id)),
+        ("GET /playlists/<id>/songs", "songs", playlist_songs_query(playlist_id)),
+        ("POST /playlists/<id>/songs", "last position", last_position_query(playlist_id)),
+        ("POST /playlists/<id>/songs/batch", "existing", existing_songs_query(playlist_id, song_ids)),
+        ("DELETE /playlists/<id>/songs/batch", "delete", delete_entries_statement(playlist_id, entry_ids)),
+        ("PATCH /playlists/<id>/songs/<entry>/move", "next position",
+         neighbour_query(playlist_id, entry_ids[0], "i", after=True)),
+        ("PATCH /playlists/<id>/songs/<entry>/move", "previous position",
+         neighbour_query(playlist_id, entry_ids[0], "i", after=False)),
+        ("DELETE /playlists/<id>/songs/<entry>", "entry", playlist_entry_query(playlist_id, entry_ids[0])),
+        ("flask ingest-tracks", "playlists to touch",
+         update(Playlist).where(Playlist.id.in_(playlists_containing(song_ids)))
+         .values(version=Playlist.version + 1)),
+    ]
+
+
+def explain(statement):
+    """Líneas del plan de la sentencia según el motor"""
+    bind = db.session.get_bind()
+    sql = str(statement.compile(bind, compile_kwargs={"literal_binds": True}))
+    if bind.dialect.name == "sqlite":
+        return [row[3] for row in db.session.execute(text("EXPLAIN QUERY PLAN " + sql))]
+    # Con tablas pequeñas PostgreSQL prefiere el Seq Scan aunque haya índice;
+    # desactivarlo muestra si existe un índice utilizable
+    db.session.execute(text("SET LOCAL enable_seqscan = off"))
+    return [row[0] for row in db.session.execute(text("EXPLAIN " + sql))]
+
+
+def is_full_scan(line):
+    if line.startswith("SCAN "):
+        return " USING " not in line and not line.startswith("SCAN CONSTANT ROW")
+    return "Seq Scan on " in line
+
+
+def check_playlist_plans(**params):
+    """Devuelve una lista de PlanCheck; no modifica datos (todo dentro de un rollback)"""
+    checks = []
+    try:
+        for route, name, statement in playlist_queries(**params):
+            plan = explain(statement)
+            checks.append(PlanCheck(route, name, plan, not any(is_full_scan(line) for line in plan)))
+    finally:
+        db.session.rollback()
+    return checks
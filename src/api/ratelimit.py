@@ -0,0 +1,174 @@
+"""
+Limitador de peticiones por ventana deslizante (aproximación de dos ventanas
+fijas ponderadas), por IP y por cuenta.
+
+Backends:
+- memoria: un único proceso
+- sqlite:///ruta.db: fichero SQLite propio compartido por todos los workers de
+  la máquina, independiente de la base de datos de la app
+
+Se elige con RATE_LIMIT_BACKEND ("memory" por defecto). El decorador se
+evalúa antes del cuerpo de la vista, así que una petición rechazada no llega a
+consultar usuarios ni a calcular ningún hash.
+"""
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import request, jsonify
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_limit(spec):
+    """'10/minute' -> (10, 60)"""
+    count, _, period = spec.partition("/")
+    return int(count), PERIODS[period.strip().rstrip("s")]
+
+
+def _estimate(previous, current, elapsed, period):
+    return previous * (1 - elapsed / period) + current
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._counters = {}  # key -> [inicio de ventana, actual, anterior]
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, period, now=None):
+        """Cuenta la petición si cabe. Devuelve (permitida, segundos hasta reintentar)"""
+        now = time.time() if now is None else now
+        window = math.floor(now / period) * period
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or counter[0] < window - period:
+                counter = [window, 0, 0]
+            elif counter[0] < window:
+                counter = [window, 0, counter[1]]
+            self._counters[key] = counter
+
+            if _estimate(counter[2], counter[1], now - window, period) >= limit:
+                return False, max(1, math.ceil(window + period - now))
+            counter[1] += 1
+
+            if len(self._counters) > 10000 and random.random() < 0.01:
+                self._prune(window - period)
+            return True, 0
+
+    def _prune(self, oldest):
+        for key in [k for k, c in self._counters.items() if c[0] < oldest]:
+            del self._counters[key]
+
+
+class SQLiteBackend:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_counters (
+                key TEXT NOT NULL,
+                window_start INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (key, window_start)
+            ) WITHOUT ROWID
+        """)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key, limit, period, now=None):
+        now = time.time() if now is None else now
+        window = int(math.floor(now / period) * period)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            counts = dict(conn.execute(
+                "SELECT window_start, count FROM rate_limit_counters WHERE key = ? AND window_start IN (?, ?)",
+                (key, window, window - period),
+            ).fetchall())
+            if _estimate(counts.get(window - period, 0), counts.get(window, 0), now - window, period) >= limit:
+                conn.execute("COMMIT")
+                return False, max(1, math.ceil(window + period - now))
+            conn.execute("""
+                INSERT INTO rate_limit_counters (key, window_start, count) VALUES (?, ?, 1)
+                ON CONFLICT (key, window_start) DO UPDATE SET count = count + 1
+            """, (key, window))
+            if random.random() < 0.01:
+                conn.execute(
+                    "DELETE FROM rate_limit_counters WHERE window_start < ?", (int(now) - 2 * 86400,)
+                )
+            conn.execute("COMMIT")
+            return True, 0
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def make_backend(spec=RATE_LIMIT_BACKEND):
+    if spec.startswith("sqlite:///"):
+        return SQLiteBackend(spec[len("sqlite:///"):])
+    return MemoryBackend()
+
+
+backend = make_backend()
+
+
+def client_ip():
+    if RATE_LIMIT_TRUST_PROXY and request.headers.get("X-Forwarded-For"):
+        return request.headers["X-Forwarded-For"].split(",")[0].strip()
+    return request.remote_addr or "unknown"
+
+
+def rate_limit(scope, per_ip=None, per_account=None, account_field="email"):
+    """Limita una vista por IP y/o por el campo de cuenta del cuerpo JSON.
+
+    Los límites son cadenas tipo "10/minute".
+    """
+    ip_limit = parse_limit(per_ip) if per_ip else None
+    account_limit = parse_limit(per_account) if per_account else None
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED or request.method == "OPTIONS":
+                return fn(*args, **kwargs)
+
+            checks = []
+            if ip_limit:
+                checks.append((f"{scope}:ip:{client_ip()}", ip_limit))
+            if account_limit:
+                data = request.get_json(silent=True)
+                if not isinstance(data, dict):
+                    # Un array o un escalar no identifica ninguna cuenta
+                    data = {}
+                account = str(data.get(account_field) or "").strip().lower()
+                if account:
+                    checks.append((f"{scope}:account:{account}", account_limit))
+
+            for key, (limit, period) in checks:
+                allowed, retry_after = backend.hit(key, limit, period)
+                if not allowed:
+                    response = jsonify({
+                        "message": "Demasiados intentos, inténtalo más tarde",
+                        "retry_after": retry_after
+                    })
+                    response.headers["Retry-After"] = str(retry_after)
+                    return response, 429
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
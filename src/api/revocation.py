@@ -0,0 +1,139 @@
+"""
+Revocación de JWT sin consulta por petición.
+
+Los JTIs revocados se guardan en `revoked_tokens` y en un índice en memoria
+(filtro de Bloom + conjunto exacto). El hook de blocklist de flask_jwt_extended
+sólo mira el índice; cada REVOCATION_SYNC_SECONDS como mucho se traen de la
+base de datos las revocaciones nuevas de otros workers, y cada
+REVOCATION_REBUILD_SECONDS se reconstruye para soltar las ya caducadas.
+
+La sincronización va por `revoked_at` y vuelve a leer una ventana de
+REVOCATION_SYNC_OVERLAP_SECONDS hacia atrás: con varios workers las
+transacciones no hacen commit en orden, y una revocación escrita un poco antes
+que otra ya sincronizada no debe perderse.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from api.models import db, RevokedToken
+
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", 5))
+REVOCATION_REBUILD_SECONDS = float(os.getenv("REVOCATION_REBUILD_SECONDS", 3600))
+REVOCATION_SYNC_OVERLAP = timedelta(seconds=float(os.getenv("REVOCATION_SYNC_OVERLAP_SECONDS", 60)))
+
+
+class BloomFilter:
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationIndex:
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        # (bloom, jtis) se sustituye entero con una sola asignación; los lectores no toman el lock
+        self._state = (BloomFilter(self.capacity), set())
+        self.synced_until = None
+        self.synced_at = 0.0
+        self.rebuilt_at = time.monotonic()
+        self._loaded = False
+
+    @property
+    def jtis(self):
+        return self._state[1]
+
+    def _fetch(self, since=None):
+        """JTIs vigentes revocados desde `since` (menos la ventana de solape); marca el nuevo punto de partida"""
+        started = datetime.utcnow()
+        query = select(RevokedToken.jti).where(RevokedToken.expires_at > started)
+        if since is not None:
+            query = query.where(RevokedToken.revoked_at >= since - REVOCATION_SYNC_OVERLAP)
+        jtis = db.session.execute(query).scalars().all()
+        self.synced_until = started
+        return jtis
+
+    def _rebuild(self):
+        """Recarga todo en estructuras nuevas y las publica de golpe"""
+        bloom, jtis = BloomFilter(self.capacity), set()
+        for jti in self._fetch():
+            bloom.add(jti)
+            jtis.add(jti)
+        self._state = (bloom, jtis)
+        self.rebuilt_at = time.monotonic()
+
+    def sync(self, force=False):
+        """Trae las revocaciones nuevas; se salta si se sincronizó hace poco"""
+        now = time.monotonic()
+        if not force and self._loaded and now - self.synced_at < REVOCATION_SYNC_SECONDS:
+            return
+        with self._lock:
+            if not force and self._loaded and now - self.synced_at < REVOCATION_SYNC_SECONDS:
+                return
+            if not self._loaded or now - self.rebuilt_at > REVOCATION_REBUILD_SECONDS:
+                self._rebuild()
+            else:
+                bloom, jtis = self._state
+                for jti in self._fetch(self.synced_until):
+                    if jti not in jtis:
+                        bloom.add(jti)
+                        jtis.add(jti)
+            self.synced_at = now
+            self._loaded = True
+
+    def is_revoked(self, jti):
+        self.sync()
+        bloom, jtis = self._state
+        # El Bloom descarta al instante la gran mayoría (tokens no revocados)
+        return jti in bloom and jti in jtis
+
+    def revoke(self, jti, expires_at, user_id=None):
+        """Añade la revocación a la sesión; llega al índice local cuando el llamador hace commit"""
+        pending = db.session.info.setdefault("revoked_jtis", set())
+        if jti in self.jtis or jti in pending:
+            return
+        db.session.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at))
+        pending.add(jti)
+
+    def publish(self, jtis):
+        with self._lock:
+            bloom, known = self._state
+            for jti in jtis:
+                bloom.add(jti)
+                known.add(jti)
+
+
+index = RevocationIndex(capacity=int(os.getenv("REVOCATION_CAPACITY", 100000)))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_revocations(session):
+    jtis = session.info.pop("revoked_jtis", None)
+    if jtis:
+        index.publish(jtis)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_revocations(session):
+    session.info.pop("revoked_jtis", None)
@@ -1,16 +1,27 @@
 """
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
-from flask import Blueprint, request, jsonify
-import requests
+from flask import Blueprint, Response, request, jsonify
 import os
-import secrets
-from datetime import datetime, timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from dotenv import load_dotenv
-from werkzeug.security import generate_password_hash
-from flask_jwt_extended import jwt_required, get_jwt_identity, JWTManager
-from api.models import db, User, Playlist, PlaylistSong
-from api.utils import generate_sitemap, APIException
+from sqlalchemy import insert, delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from api.models import db, User, Playlist, PlaylistSong, Track
+from api.utils import generate_sitemap, APIException, encode_cursor, decode_cursor, stream_json, stream_query, \
+    wants_ndjson, not_modified, with_etag, violates_unique
+from api.cache import ResponseCache, make_key
+from api.singleflight import SingleFlight
+from api.moods import resolve as resolve_mood
+from api import jamendo, catalog, waveform, positions
+from api.search import search_tracks
+from api.versions import touch_user, touch_playlist
+from api.passwords import hasher, PasswordHasherBusy
+from api.ratelimit import rate_limit
+from api.identity import user_required, admin_required, current_principal
 
 
 
@@ -18,24 +29,103 @@ load_dotenv()
 
 api = Blueprint('api', __name__)
 
-JAMENDO_CLIENT_ID = os.getenv("JAMENDO_CLIENT_ID", "64b5cce9") 
+mood_cache = ResponseCache(
+    max_entries=int(os.getenv("MOOD_CACHE_MAX_ENTRIES", 256)),
+    max_bytes=int(os.getenv("MOOD_CACHE_MAX_BYTES", 8 * 1024 * 1024)),
+    ttl=int(os.getenv("MOOD_CACHE_TTL", 600)),
+    stale_ttl=int(os.getenv("MOOD_CACHE_STALE_TTL", 3600)),
+)
+mood_flight = SingleFlight()
+
+# Waveforms reducidos por (canción, resolución); no cambian, así que TTL largo
+waveform_cache = ResponseCache(
+    max_entries=int(os.getenv("WAVEFORM_CACHE_MAX_ENTRIES", 4096)),
+    max_bytes=int(os.getenv("WAVEFORM_CACHE_MAX_BYTES", 4 * 1024 * 1024)),
+    ttl=86400,
+    stale_ttl=0,
+)
+# Canciones sin waveform: se cachea la ausencia (b"") para no volver a Jamendo en cada petición
+WAVEFORM_MISSING = b""
+WAVEFORM_MISS_TTL = int(os.getenv("WAVEFORM_MISS_TTL", 600))
+WAVEFORM_BATCH_MAX = 50
+
+MOOD_PAGE_SIZE = 20
+MOOD_MAX_PAGE_SIZE = 200  # máximo que acepta Jamendo
+MOOD_PREFETCH = os.getenv("MOOD_PREFETCH", "true").lower() == "true"
+MOOD_SOURCES = ("catalog", "jamendo")  # fuente actual del scroll, guardada en el cursor
+# Ids del catálogo que el cursor lleva al pasar a Jamendo; acota el tamaño del cursor
+MOOD_CURSOR_SKIP_MAX = 200
+MOOD_FANOUT_MAX_MOODS = 10
+
+# Pool compartido por todas las peticiones multi-mood: limita las llamadas
+# simultáneas a Jamendo desde este proceso
+mood_fanout_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("MOOD_FANOUT_CONCURRENCY", 8)),
+    thread_name_prefix="mood-fanout",
+)
+
+# Prefetch de la página siguiente: pool propio y pequeño para que no quite
+# sitio a las peticiones que sí esperan un usuario; lo que no cabe se descarta
+mood_prefetch_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("MOOD_PREFETCH_CONCURRENCY", 2)),
+    thread_name_prefix="mood-prefetch",
+)
+MOOD_PREFETCH_MAX_PENDING = int(os.getenv("MOOD_PREFETCH_MAX_PENDING", 32))
+_prefetch_pending = set()
+_prefetch_lock = threading.Lock()
 
 @api.route('/hello', methods=['GET', 'POST'])
 def handle_hello():
     return jsonify({"message": "Hello! I'm a message that came from the backend."}), 200
 
 @api.route('/admin-zone', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_zone():
-    user = get_jwt_identity()
-    user_from_db = User.query.get(user['id'])
+    user = current_principal()
+    return jsonify({"msg": f"Bienvenido, admin {user.email}"}), 200
+
+@api.route('/admin/users/import', methods=['POST'])
+@admin_required
+def import_users():
+    """Alta masiva de usuarios desde CSV o NDJSON (cuerpo de la petición o campo 'file').
+
+    Hasta IMPORT_REQUEST_MAX_ROWS filas, hasheadas en este proceso para no pasar
+    del timeout del worker; los ficheros grandes van por `flask import-users`.
+    """
+    from api.bulk_import import import_stream, detect_format, ImportTooLarge, IMPORT_BATCH_SIZE, \
+        IMPORT_REQUEST_MAX_ROWS
+
+    batch_size = min(max(request.args.get('batch_size', IMPORT_BATCH_SIZE, type=int), 1), 10000)
+    verified = request.args.get('verified', 'false').lower() == 'true'
+
+    upload = request.files.get('file')
+    if upload:
+        stream, fmt = upload.stream, detect_format(upload.filename, upload.content_type)
+    else:
+        stream, fmt = request.stream, detect_format(content_type=request.content_type)
+    fmt = request.args.get('format', fmt)
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'message': 'format debe ser csv o ndjson'}), 400
 
-    if not user_from_db:
-        return jsonify({"msg": "Acceso denegado"}), 403
-
-    return jsonify({"msg": f"Bienvenido, admin {user['email']}"}), 200
+    try:
+        report = import_stream(stream, fmt, max_rows=IMPORT_REQUEST_MAX_ROWS,
+                               batch_size=batch_size, verified=verified, processes=1)
+    except ImportTooLarge as e:
+        return jsonify({'message': f'Máximo {e.max_rows} filas por petición; '
+                                   f'para ficheros más grandes usa `flask import-users`'}), 413
+    except UnicodeDecodeError:
+        return jsonify({'message': 'El fichero debe estar en UTF-8'}), 400
+    except Exception as e:
+        print(f'Error importando usuarios: {e}')
+        return jsonify({'message': 'Error importando usuarios'}), 500
+    return jsonify(report.to_dict()), 200
 
 @api.route('/register', methods=['POST', 'OPTIONS'])
+@rate_limit(
+    "register",
+    per_ip=os.getenv("REGISTER_RATE_LIMIT_IP", "10/hour"),
+    per_account=os.getenv("REGISTER_RATE_LIMIT_ACCOUNT", "3/hour"),
+)
 def register():
     if request.method == 'OPTIONS':
         return jsonify({}), 200
@@ -75,42 +165,39 @@ def register():
             username=data['username'],
             email=data['email'].lower(),
             date_of_birth=datetime.strptime(data['date_of_birth'], '%Y-%m-%d').date() if data.get('date_of_birth') else None,
-            password_hash=generate_password_hash(data['password']),
+            password_hash=hasher.hash(data['password']),
             email_verified=False
         )
-        
 
-        user.verification_token = secrets.token_urlsafe(32)
-        user.verification_token_expires = datetime.utcnow() + timedelta(hours=24)
-        
-       
+        token = user.generate_verification_token()
+
         db.session.add(user)
-        db.session.flush()  
-        
+
         from api.email_service import send_verification_email
-        
-        try:
-            email_sent = send_verification_email(user)
-            if email_sent:
-                db.session.commit() 
-                return jsonify({
-                    'message': 'Registration successful! Please check your email to verify your account.',
-                    'email': user.email
-                }), 201
-            else:
-                db.session.rollback()
-                return jsonify({'message': 'Registration failed. Email could not be sent.'}), 500
-        except Exception as email_error:
-            db.session.rollback()
-            print(f'Email error: {email_error}')
-            return jsonify({'message': 'Registration failed. Please try again.'}), 500
+
+        # El email va a la bandeja de salida en la misma transacción; se envía
+        # en segundo plano tras el commit
+        send_verification_email(user, token)
+        db.session.commit()
+        return jsonify({
+            'message': 'Registration successful! Please check your email to verify your account.',
+            'email': user.email
+        }), 201
             
+    except PasswordHasherBusy as e:
+        db.session.rollback()
+        return jsonify({'message': e.message}), 503
     except Exception as e:
         db.session.rollback()
         print(f'Registration error: {e}')
         return jsonify({'message': 'Registration failed. Please try again.'}), 500
 
 @api.route('/resend-verification', methods=['POST', 'OPTIONS'])
+@rate_limit(
+    "resend-verification",
+    per_ip=os.getenv("RESEND_RATE_LIMIT_IP", "10/hour"),
+    per_account=os.getenv("RESEND_RATE_LIMIT_ACCOUNT", "3/hour"),
+)
 def resend_verification():
     if request.method == 'OPTIONS':
         return jsonify({}), 200
@@ -142,16 +229,12 @@ def resend_verification():
                 }), 429
         
         # GENERAR NUEVO TOKEN antes de enviar
-        user.verification_token = secrets.token_urlsafe(32)
-        user.verification_token_expires = datetime.utcnow() + timedelta(hours=24)
-        
+        token = user.generate_verification_token()
+
         from api.email_service import send_verification_email
-        if send_verification_email(user):
-            db.session.commit()  # Commit después de enviar email
-            return jsonify({'message': 'Verification email sent successfully'}), 200
-        else:
-            db.session.rollback()
-            return jsonify({'message': 'Failed to send verification email'}), 500
+        send_verification_email(user, token)
+        db.session.commit()
+        return jsonify({'message': 'Verification email sent successfully'}), 200
             
     except Exception as e:
         db.session.rollback()
@@ -160,45 +243,326 @@ def resend_verification():
 
 # MÚSICA
 
+def fetch_mood_tracks(params):
+    tracks = jamendo.client.tracks(**params)
+    # Lo que viene de Jamendo alimenta también el catálogo local
+    catalog.refresher.enqueue_tracks(tracks)
+    return [
+        {
+            "id": track["id"],
+            "name": track["name"],
+            "artist": track["artist_name"],
+            "audio": track["audio"],
+            "image": track.get("album_image") or track.get("image"),
+            "license": track["license_ccurl"],
+            "duration": track["duration"],
+            "album_name": track["album_name"],
+            "release_date": track["releasedate"],
+            "genres": track["musicinfo"]["tags"]["genres"],
+        }
+        for track in tracks
+    ]
+
+
+def mood_params(mood, limit=MOOD_PAGE_SIZE, offset=0):
+    params = {
+        "limit": limit,
+        "audioformat": "mp31",
+        "include": "musicinfo",
+        "fuzzytags": mood,
+        "audiodownload_allowed": "true"
+    }
+    if offset:
+        params["offset"] = offset
+    return params
+
+
+def get_mood_page(params):
+    key = make_key(params)
+    try:
+        return mood_cache.get_or_fetch(
+            key, lambda: mood_flight.do(key, lambda: fetch_mood_tracks(params))
+        )
+    except jamendo.JamendoError as e:
+        # Si Jamendo está caído servimos lo último que tengamos, aunque esté expirado
+        cached = mood_cache.get(key, allow_stale=True)
+        if cached is None:
+            status = 503 if isinstance(e, jamendo.CircuitOpenError) else 502
+            raise APIException(str(e), status)
+        return cached
+
+
+def prefetch_mood_page(params):
+    """Calienta en segundo plano la caché de la página siguiente"""
+    key = make_key(params)
+    if mood_cache.get(key) is not None:
+        return
+
+    with _prefetch_lock:
+        if key in _prefetch_pending or len(_prefetch_pending) >= MOOD_PREFETCH_MAX_PENDING:
+            return
+        _prefetch_pending.add(key)
+
+    def run():
+        try:
+            get_mood_page(params)
+        except Exception as e:
+            print(f"Error en prefetch de {key}: {e}")
+        finally:
+            with _prefetch_lock:
+                _prefetch_pending.discard(key)
+
+    mood_prefetch_pool.submit(run)
+
+
 @api.route('/music/mood/<string:mood>', methods=['GET'])
 def get_music_by_mood(mood):
     try:
-        url = "https://api.jamendo.com/v3.0/tracks"
-        params = {
-            "client_id": JAMENDO_CLIENT_ID,
-            "format": "json",
-            "limit": 20,
-            "audioformat": "mp31",
-            "include": "musicinfo",
-            "fuzzytags": mood,
-            "audiodownload_allowed": "true"
-        }
-        response = requests.get(url, params=params)
-        if response.status_code != 200:
-            raise APIException("Error al conectar con Jamendo", 500)
-        
-        tracks = response.json().get("results", [])
-        simplified = [
-            {
-                "id": track["id"],
-                "name": track["name"],
-                "artist": track["artist_name"],
-                "audio": track["audio"],
-                "image": track.get("album_image") or track.get("image"),
-                "license": track["license_ccurl"],
-                "duration": track["duration"],
-                "album_name": track["album_name"],
-                "release_date": track["releasedate"],
-                "waveform": track["waveform"],
-                "genres": track["musicinfo"]["tags"]["genres"],
-            }
-            for track in tracks
-        ]
-
-        return jsonify(simplified), 200
+        resolved = resolve_mood(mood)
+        if resolved is None:
+            raise APIException("Mood inválido", 400)
+        # A partir de aquí trabajamos con los tags canónicos
+        mood = resolved.fuzzytags
+
+        limit = request.args.get('limit', MOOD_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, MOOD_MAX_PAGE_SIZE))
+        cursor = decode_cursor(request.args.get('cursor'))
+        offset, source, skip = cursor.get('offset', 0), cursor.get('src'), cursor.get('skip', [])
+        if not isinstance(offset, int) or offset < 0 or source not in (None, *MOOD_SOURCES) \
+                or not isinstance(skip, list) or not all(isinstance(i, str) for i in skip):
+            raise APIException("Cursor inválido", 400)
+
+        # La primera página elige la fuente: el catálogo local si la llena, si no
+        # Jamendo. Cada una ordena distinto, así que no se avanza en una con el
+        # offset de la otra: cuando el catálogo se queda corto el scroll empieza
+        # Jamendo desde el principio y el cursor lleva (hasta MOOD_CURSOR_SKIP_MAX)
+        # los ids ya servidos desde el catálogo para no repetirlos.
+        simplified = []
+        if source in (None, "catalog"):
+            simplified = catalog.tracks_for_mood(mood, limit, offset)
+            if source is None and len(simplified) < limit:
+                simplified, source = [], "jamendo"
+            else:
+                catalog.refresher.request_refresh(mood)
+                if len(simplified) < limit:
+                    earlier = catalog.tracks_for_mood(mood, offset, 0) if offset else []
+                    skip = [track["id"] for track in earlier + simplified][-MOOD_CURSOR_SKIP_MAX:]
+                    source, offset = "jamendo", 0
+                else:
+                    source = "catalog"
+
+        if source == "jamendo":
+            page_limit = limit - len(simplified)
+            upstream = get_mood_page(mood_params(mood, page_limit, offset))
+            excluded = set(skip)
+            simplified += [track for track in upstream if track["id"] not in excluded]
+            more, next_offset = len(upstream) >= page_limit, offset + page_limit
+        else:
+            more, next_offset = True, offset + limit
+
+        response = stream_json(simplified)
+        response.headers['X-Resolved-Mood'] = resolved.key
+        # Página completa: probablemente hay más resultados
+        if more:
+            next_cursor = {"src": source, "offset": next_offset}
+            if skip:
+                next_cursor["skip"] = skip
+            next_cursor = encode_cursor(next_cursor)
+            response.headers['X-Next-Cursor'] = next_cursor
+            response.headers['Link'] = (
+                f'<{request.base_url}?limit={limit}&cursor={next_cursor}>; rel="next"'
+            )
+            if MOOD_PREFETCH and source == "jamendo":
+                prefetch_mood_page(mood_params(mood, limit, next_offset))
+        return response, 200
+    except APIException:
+        raise
     except Exception as e:
         raise APIException(str(e), 500)
 
+
+def fetch_waveform_tracks(params):
+    results = jamendo.client.tracks(**params)
+    catalog.refresher.enqueue_tracks(results)
+    return {str(track["id"]): track.get("waveform") for track in results}
+
+
+def load_raw_waveforms(track_ids, upstream=True):
+    """{id: waveform en bruto} del catálogo y, para los que falten, de una sola llamada a Jamendo"""
+    raws = dict(db.session.execute(
+        db.select(Track.id, Track.waveform)
+        .where(Track.id.in_(track_ids), Track.waveform.is_not(None))
+    ).all())
+    missing = sorted(set(track_ids) - set(raws))
+    if missing and upstream:
+        # Jamendo acepta varios ids separados por espacios
+        params = {"id": " ".join(missing), "limit": len(missing), "include": "musicinfo", "audioformat": "mp31"}
+        key = make_key(params)
+        raws.update(mood_flight.do(key, lambda: fetch_waveform_tracks(params)))
+    return raws
+
+
+def waveform_peaks(track_ids, points, upstream=True):
+    """{id: picos reducidos en bytes, o None si no hay waveform}.
+
+    Sin upstream sólo se mira el catálogo y las ausencias no se cachean.
+    """
+    result, pending = {}, []
+    for track_id in track_ids:
+        data = waveform_cache.get((track_id, points))
+        if data is None:
+            pending.append(track_id)
+        else:
+            result[track_id] = data or None
+    if not pending:
+        return result
+
+    raws = load_raw_waveforms(pending, upstream)
+    for track_id in pending:
+        try:
+            peaks = waveform.parse_peaks(raws.get(track_id))
+        except ValueError:
+            peaks = None
+        if peaks is None:
+            if upstream:
+                waveform_cache.set((track_id, points), WAVEFORM_MISSING, ttl=WAVEFORM_MISS_TTL, size=1)
+            result[track_id] = None
+            continue
+        data = waveform.downsample(peaks, points).tobytes()
+        waveform_cache.set((track_id, points), data, size=len(data))
+        result[track_id] = data
+    return result
+
+
+def waveform_points():
+    points = request.args.get('points', waveform.DEFAULT_POINTS, type=int)
+    return max(waveform.MIN_POINTS, min(points, waveform.MAX_POINTS))
+
+
+@api.route('/music/tracks/<string:track_id>/waveform', methods=['GET'])
+def get_track_waveform(track_id):
+    try:
+        data = waveform_peaks([track_id], waveform_points())[track_id]
+    except jamendo.JamendoError as e:
+        raise APIException(str(e), 502)
+    if data is None:
+        raise APIException("Waveform no disponible", 404)
+
+    best = request.accept_mimetypes.best_match(['application/json', 'application/octet-stream'])
+    if best == 'application/octet-stream':
+        return Response(data, mimetype='application/octet-stream')
+    return jsonify({"id": track_id, "points": len(data), "peaks": list(data)}), 200
+
+
+@api.route('/music/waveforms', methods=['GET'])
+def get_track_waveforms():
+    """Waveforms de una página de resultados (?ids=a,b,c) en una petición; peaks null si no hay"""
+    track_ids = list(dict.fromkeys(i.strip() for i in request.args.get('ids', '').split(',') if i.strip()))
+    if not track_ids:
+        raise APIException("Indica los ids en ?ids=", 400)
+    if len(track_ids) > WAVEFORM_BATCH_MAX:
+        raise APIException(f"Máximo {WAVEFORM_BATCH_MAX} canciones por petición", 400)
+
+    points = waveform_points()
+    try:
+        peaks = waveform_peaks(track_ids, points)
+    except jamendo.JamendoError:
+        # Con Jamendo caído devolvemos al menos lo que haya en el catálogo
+        peaks = waveform_peaks(track_ids, points, upstream=False)
+    return jsonify([
+        {"id": track_id, "points": len(peaks[track_id]) if peaks[track_id] else 0,
+         "peaks": list(peaks[track_id]) if peaks[track_id] else None}
+        for track_id in track_ids
+    ]), 200
+
+
+@api.route('/music/moods', methods=['GET'])
+def get_music_by_moods():
+    moods = []
+    for m in request.args.get('m', '').split(','):
+        m = m.strip()
+        if m and m not in moods:
+            moods.append(m)
+    if not moods:
+        raise APIException("Indica al menos un mood con ?m=", 400)
+    if len(moods) > MOOD_FANOUT_MAX_MOODS:
+        raise APIException(f"Máximo {MOOD_FANOUT_MAX_MOODS} moods por petición", 400)
+    limit = max(1, min(request.args.get('limit', MOOD_PAGE_SIZE, type=int), MOOD_MAX_PAGE_SIZE))
+
+    # Variantes del mismo mood ("happy", "feliz") se piden una sola vez
+    resolved = {}
+    for mood in moods:
+        resolution = resolve_mood(mood)
+        if resolution is None:
+            raise APIException(f"Mood inválido: {mood}", 400)
+        resolved[mood] = resolution
+
+    # El catálogo se lee en este hilo (necesita el contexto de la app);
+    # sólo lo que falta se pide a Jamendo en paralelo
+    pages = {}
+    pending = {}
+    for resolution in resolved.values():
+        tags = resolution.fuzzytags
+        if tags in pages or tags in pending:
+            continue
+        local = catalog.tracks_for_mood(tags, limit)
+        if len(local) >= limit:
+            catalog.refresher.request_refresh(tags)
+            pages[tags] = local
+        else:
+            pending[tags] = mood_fanout_pool.submit(get_mood_page, mood_params(tags, limit))
+
+    errors = {}
+    for tags, future in pending.items():
+        try:
+            pages[tags] = future.result()
+        except Exception as e:
+            errors[tags] = e.message if isinstance(e, APIException) else str(e)
+
+    tracks = {}
+    sections = []
+    for mood in moods:
+        tags = resolved[mood].fuzzytags
+        section = {"mood": mood, "resolved": resolved[mood].key, "track_ids": []}
+        if tags in errors:
+            section["error"] = errors[tags]
+        for track in pages.get(tags, []):
+            tracks.setdefault(track["id"], track)
+            section["track_ids"].append(track["id"])
+        sections.append(section)
+
+    if errors and not tracks:
+        raise APIException("Error al conectar con Jamendo", 502)
+
+    return jsonify({"sections": sections, "tracks": list(tracks.values())}), 200
+
+
+@api.route('/music/search', methods=['GET'])
+def search_music():
+    q = request.args.get('q', '').strip()
+    if not q:
+        raise APIException("El parámetro q es obligatorio", 400)
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    cursor = decode_cursor(request.args.get('cursor'))
+
+    try:
+        results, last = search_tracks(q, limit, cursor.get('s'), cursor.get('id'))
+    except ValueError:
+        raise APIException("Cursor inválido", 400)
+
+    response = jsonify(results)
+    if last:
+        response.headers['X-Next-Cursor'] = encode_cursor({"s": last[0], "id": last[1]})
+    return response, 200
+
+
+@api.route('/music/cache/stats', methods=['GET'])
+def get_music_cache_stats():
+    stats = mood_cache.stats()
+    stats["upstream"] = jamendo.client.stats()
+    stats["singleflight"] = mood_flight.stats()
+    return jsonify(stats), 200
+
 # PLAYLISTS 
 
 
@@ -206,21 +570,11 @@ def get_music_by_mood(mood):
 
 
 @api.route('/playlists', methods=['POST'])
-@jwt_required()
+@user_required
 def create_playlist():
     try:
-        user_id_str = get_jwt_identity()  
-        user_id = int(user_id_str)       
-        
-        print(f"User ID from token: {user_id}")
-        print(f"Type of user_id: {type(user_id)}")
-        
-        user = db.session.get(User, user_id)
-        print(f"User found: {user}")
-        
-        if not user:
-            print("Usuario no encontrado en la base de datos")
-            return jsonify({"error": "Usuario no encontrado"}), 404
+        user = current_principal()
+        print(f"User ID from token: {user.id}")
 
         data = request.get_json()
         name = data.get('name')
@@ -237,6 +591,9 @@ def create_playlist():
             description=description,
             user_id=user.id
         )
+        # Arranca en la versión del usuario: si se reutiliza el id de una playlist
+        # borrada, sus ETags no coinciden con los de la anterior
+        playlist.version = touch_user(user.id)
         
         db.session.add(playlist)
         db.session.commit()
@@ -261,39 +618,103 @@ def create_playlist():
 #OBTENER PLAYLISTS
 
 
+def playlist_overview(user_id, include_songs=False):
+    """Playlists del usuario con song_count y total_duration en un único GROUP BY.
+
+    Con include_songs las canciones de todas las playlists llegan en una sola
+    consulta IN adicional (selectinload) en vez de una por playlist.
+    """
+    query = (
+        db.select(
+            Playlist,
+            db.func.count(PlaylistSong.id).label('song_count'),
+            db.func.coalesce(db.func.sum(Track.duration), 0).label('total_duration'),
+        )
+        .outerjoin(PlaylistSong, PlaylistSong.playlist_id == Playlist.id)
+        .outerjoin(Track, Track.id == PlaylistSong.track_id)
+        .where(Playlist.user_id == user_id)
+        .group_by(Playlist.id)
+        .order_by(Playlist.id)
+    )
+    if include_songs:
+        query = query.options(selectinload(Playlist.songs))
+    return query
+
+
+def serialize_playlist(row, include_songs=False):
+    playlist, song_count, total_duration = row
+    data = {
+        "id": playlist.id,
+        "name": playlist.name,
+        "description": playlist.description,
+        "created_at": playlist.created_at.isoformat(),
+        "song_count": song_count,
+        "total_duration": int(total_duration or 0),
+    }
+    if include_songs:
+        data["songs"] = [s.serialize() for s in playlist.songs]
+    return data
+
+
+def include_songs_requested():
+    return 'songs' in request.args.get('include', '').split(',')
+
+
+def playlists_version_query(user_id):
+    return db.select(User.playlists_version).where(User.id == user_id)
+
+
+def playlist_version_query(playlist_id, user_id):
+    return db.select(Playlist.version).filter_by(id=playlist_id, user_id=user_id)
+
+
+def playlist_songs_query(playlist_id):
+    return db.select(PlaylistSong).filter_by(playlist_id=playlist_id).order_by(PlaylistSong.position, PlaylistSong.id)
+
+
+def playlist_entry_query(playlist_id, entry_id, column=PlaylistSong):
+    return db.select(column).filter_by(id=entry_id, playlist_id=playlist_id)
+
+
+def existing_songs_query(playlist_id, song_ids):
+    """(song_id, id de la entrada) de las canciones que ya están en la playlist"""
+    return (
+        db.select(PlaylistSong.song_id, PlaylistSong.id)
+        .where(PlaylistSong.playlist_id == playlist_id, PlaylistSong.song_id.in_(list(song_ids)))
+    )
+
+
+def delete_entries_statement(playlist_id, entry_ids):
+    return (
+        delete(PlaylistSong)
+        .where(PlaylistSong.playlist_id == playlist_id, PlaylistSong.id.in_(list(entry_ids)))
+        .returning(PlaylistSong.id)
+    )
+
+
+def playlist_version(playlist_id, user_id):
+    return db.session.execute(playlist_version_query(playlist_id, user_id)).scalar_one_or_none()
+
+
+def playlist_etag(scope, key, version, include_songs=False):
+    """Cambia con la versión y con la representación (JSON o NDJSON, con o sin canciones)"""
+    variant = 'ndjson' if wants_ndjson() else 'json'
+    return f"{scope}-{key}-v{version}-{variant}{'-songs' if include_songs else ''}"
+
+
 @api.route('/playlists', methods=['GET'])
-@jwt_required()
+@user_required
 def get_playlists():
     try:
-        user_id_str = get_jwt_identity()  
-        user_id = int(user_id_str)     
-        
-        print(f"User ID from token: {user_id}")
-        print(f"Type of user_id: {type(user_id)}")
-        
-        user = db.session.get(User, user_id)
-        print(f"User found: {user}")
-        
-        if not user:
-            print("Usuario no encontrado en la base de datos")
-            return jsonify({"error": "Usuario no encontrado"}), 404
-
-        playlists = db.session.execute(
-            db.select(Playlist).filter_by(user_id=user.id)
-        ).scalars().all()
-        
-        print(f"Playlists encontradas: {len(playlists)}")
-
-        serialized = [
-            {
-                "id": p.id,
-                "name": p.name,
-                "description": p.description,
-                "created_at": p.created_at.isoformat()
-            } for p in playlists
-        ]
-
-        return jsonify(serialized), 200
+        user = current_principal()
+        include_songs = include_songs_requested()
+        version = db.session.execute(playlists_version_query(user.id)).scalar_one()
+        etag = playlist_etag('playlists', user.id, version, include_songs)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        return with_etag(stream_query(playlist_overview(user.id, include_songs),
+                                      lambda row: serialize_playlist(row, include_songs)), etag)
         
     except Exception as e:
         print(f"Error en get_playlists: {str(e)}")
@@ -303,22 +724,37 @@ def get_playlists():
         return jsonify({"error": "Error interno del servidor"}), 500
 
 
+@api.route('/playlists/<int:playlist_id>', methods=['GET'])
+@user_required
+def get_playlist(playlist_id):
+    """Una playlist con sus totales y, salvo ?include= sin 'songs', sus canciones"""
+    user = current_principal()
+    include_songs = 'include' not in request.args or include_songs_requested()
+    version = playlist_version(playlist_id, user.id)
+    if version is None:
+        return jsonify({"error": "Playlist no encontrada o sin permiso"}), 404
+    etag = playlist_etag('playlist', playlist_id, version, include_songs)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    row = db.session.execute(
+        playlist_overview(user.id, include_songs).where(Playlist.id == playlist_id)
+    ).one_or_none()
+    if row is None:
+        return jsonify({"error": "Playlist no encontrada o sin permiso"}), 404
+    return with_etag(jsonify(serialize_playlist(row, include_songs)), etag), 200
+
+
 #ELIMINAR PLAYLISTS
 
 
 @api.route('/playlists/<int:playlist_id>', methods=['DELETE'])
-@jwt_required()
+@user_required
 def delete_playlist(playlist_id):
     try:
         
-        user_id_str = get_jwt_identity()
-        user_id = int(user_id_str)
-
-       
-        user = db.session.get(User, user_id)
-
-        if not user:
-            return jsonify({"error": "Usuario no encontrado"}), 404
+        user = current_principal()
 
         
         playlist = db.session.execute(
@@ -330,6 +766,7 @@ def delete_playlist(playlist_id):
 
         
         db.session.delete(playlist)
+        touch_user(user.id)
         db.session.commit()
 
         return jsonify({"message": "Playlist eliminada"}), 200
@@ -341,30 +778,19 @@ def delete_playlist(playlist_id):
 
 
 @api.route('/playlists/<int:playlist_id>/songs', methods=['POST'])
-@jwt_required()
+@user_required
 def add_song_to_playlist(playlist_id):
     try:
 
-        user_id_str = get_jwt_identity()
-        user_id = int(user_id_str)
-
-        user = db.session.get(User, user_id)
-
-        if not user:
-            return jsonify({"error": "Usuario no encontrado"}), 404
+        user = current_principal()
 
         data = request.get_json()
 
-        song_id = data.get('song_id')
-        name = data.get('name')
-        artist = data.get('artist')
-        audio_url = data.get('audio_url')
-        genre = data.get('genre') 
-        duration = data.get('duration')  
-        release_date = data.get('release_date')
-
-        if not all([song_id, name, artist, audio_url]):
-            return jsonify({"error": "Faltan datos obligatorios de la canción"}), 400
+        try:
+            values = playlist_track_values(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        song_id = values['id']
 
         playlist = db.session.execute(
             db.select(Playlist).filter_by(id=playlist_id, user_id=user.id)
@@ -373,28 +799,23 @@ def add_song_to_playlist(playlist_id):
         if not playlist:
             return jsonify({"error": "Playlist no encontrada o sin permiso"}), 404
 
-        existing = db.session.execute(
-            db.select(PlaylistSong).filter_by(playlist_id=playlist_id, song_id=song_id)
-        ).scalar_one_or_none()
-
-        if existing:
-            return jsonify({"message": "La canción ya está en la playlist"}), 200
-
-        new_song = PlaylistSong(
-            playlist_id=playlist_id,
-            song_id=song_id,
-            name=name,
-            artist=artist,
-            audio_url=audio_url,
-            image_url=data.get('image_url'),
-            license_url=data.get('license_url'),
-            genre=genre,  
-            duration=duration,  
-            release_date=datetime.strptime(release_date, '%Y-%m-%d').date() if release_date else None  
-        )
+        catalog.ensure_tracks([values])
+        new_song = PlaylistSong(playlist_id=playlist_id, track_id=song_id,
+                                position=positions.append_position(playlist_id))
 
         db.session.add(new_song)
-        db.session.commit()
+        try:
+            touch_playlist(playlist_id, user.id)
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if violates_unique(e, PlaylistSong.__table__, 'uq_playlist_songs_playlist_id_track_id'):
+                # Ya estaba (o la añadió otra petición a la vez)
+                return jsonify({"message": "La canción ya está en la playlist"}), 200
+            if db.session.get(Playlist, playlist_id) is None:
+                # Borrada por otra petición entre la consulta y el INSERT
+                return jsonify({"error": "Playlist no encontrada o sin permiso"}), 404
+            raise
 
         return jsonify({"message": "Canción añadida a la playlist"}), 201
 
@@ -403,36 +824,159 @@ def add_song_to_playlist(playlist_id):
         traceback.print_exc()
         return jsonify({"error": f"Error al agregar canción: {str(e)}"}), 500
 
-# OBTENER CANCIONES DE PLAYLISTS
 
-@api.route('/playlists/<int:playlist_id>/songs', methods=['GET'])
-@jwt_required()
-def get_songs_in_playlist(playlist_id):
+PLAYLIST_BATCH_MAX = int(os.getenv("PLAYLIST_BATCH_MAX", 500))
+
+
+def playlist_track_values(data):
+    """Fila de `tracks` a partir del JSON de una canción; ValueError si faltan datos"""
+    if not isinstance(data, dict):
+        raise ValueError("Canción no válida")
+    if not all(data.get(f) for f in ('song_id', 'name', 'artist', 'audio_url')):
+        raise ValueError("Faltan datos obligatorios de la canción")
+    release_date = data.get('release_date')
+    return {
+        "id": str(data['song_id']),
+        "name": data['name'],
+        "artist": data['artist'],
+        "audio_url": data['audio_url'],
+        "image_url": data.get('image_url'),
+        "license_url": data.get('license_url'),
+        "genres": catalog.parse_genres(data.get('genre') or data.get('genres')),
+        "duration": data.get('duration'),
+        "release_date": datetime.strptime(release_date, '%Y-%m-%d').date() if release_date else None,
+    }
+
+
+def owned_playlist_id(playlist_id, user_id):
+    return db.session.execute(
+        db.select(Playlist.id).filter_by(id=playlist_id, user_id=user_id)
+    ).scalar_one_or_none()
+
+
+@api.route('/playlists/<int:playlist_id>/songs/batch', methods=['POST'])
+@user_required
+def add_songs_to_playlist(playlist_id):
+    """Añade varias canciones con una consulta de duplicados, un INSERT y un commit"""
+    user = current_principal()
+    data = request.get_json(silent=True)
+    songs = data.get('songs') if isinstance(data, dict) else data
+    if not isinstance(songs, list) or not songs:
+        return jsonify({"error": "Se esperaba una lista de canciones en 'songs'"}), 400
+    if len(songs) > PLAYLIST_BATCH_MAX:
+        return jsonify({"error": f"Máximo {PLAYLIST_BATCH_MAX} canciones por petición"}), 400
+
+    if owned_playlist_id(playlist_id, user.id) is None:
+        return jsonify({"error": "Playlist no encontrada o sin permiso"}), 404
+
+    results = [None] * len(songs)
+    pending = {}  # song_id -> (índice, valores)
+    for index, song in enumerate(songs):
+        try:
+            values = playlist_track_values(song)
+        except ValueError as e:
+            results[index] = {"index": index, "status": "invalid", "error": str(e)}
+            continue
+        if values['id'] in pending:
+            results[index] = {"index": index, "song_id": values['id'], "status": "duplicate"}
+            continue
+        pending[values['id']] = (index, values)
+
+    existing = {}
+    if pending:
+        existing = dict(db.session.execute(existing_songs_query(playlist_id, pending)).all())
+
+    tracks, rows = [], []
+    for song_id, (index, values) in pending.items():
+        if song_id in existing:
+            results[index] = {"index": index, "song_id": song_id, "status": "exists", "id": existing[song_id]}
+        else:
+            tracks.append(values)
+            rows.append({"playlist_id": playlist_id, "track_id": song_id, "added_at": datetime.utcnow()})
+
     try:
+        if rows:
+            catalog.ensure_tracks(tracks)
+            position = positions.append_position(playlist_id)
+            for row in rows:
+                row["position"] = position
+                position = positions.key_after(position)
+            # song_id es único dentro del lote, así que no hace falta conservar el orden
+            inserted = db.session.execute(
+                insert(PlaylistSong).returning(PlaylistSong.id, PlaylistSong.track_id), rows
+            ).all()
+            touch_playlist(playlist_id, user.id)
+            db.session.commit()
+            for entry_id, song_id in inserted:
+                index = pending[song_id][0]
+                results[index] = {"index": index, "song_id": song_id, "status": "added", "id": entry_id}
+    except IntegrityError as e:
+        db.session.rollback()
+        if not violates_unique(e, PlaylistSong.__table__, 'uq_playlist_songs_playlist_id_track_id'):
+            print(f"Error en add_songs_to_playlist: {e}")
+            return jsonify({"error": "Error al agregar canciones"}), 500
+        # Otra petición añadió alguna de estas canciones entre la consulta y el INSERT
+        return jsonify({"error": "La playlist cambió mientras se añadían las canciones, inténtalo de nuevo"}), 409
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error en add_songs_to_playlist: {e}")
+        return jsonify({"error": "Error al agregar canciones"}), 500
+
+    summary = {status: sum(1 for r in results if r["status"] == status)
+               for status in ("added", "exists", "duplicate", "invalid")}
+    return jsonify({**summary, "results": results}), 201 if summary["added"] else 200
+
+
+@api.route('/playlists/<int:playlist_id>/songs/batch', methods=['DELETE'])
+@user_required
+def remove_songs_from_playlist(playlist_id):
+    """Quita varias entradas de la playlist con un único DELETE"""
+    user = current_principal()
+    data = request.get_json(silent=True) or {}
+    entry_ids = data.get('entry_ids') if isinstance(data, dict) else None
+    if not isinstance(entry_ids, list) or not entry_ids or \
+            not all(isinstance(i, int) and not isinstance(i, bool) for i in entry_ids):
+        return jsonify({"error": "Se esperaba una lista de ids en 'entry_ids'"}), 400
+    entry_ids = list(dict.fromkeys(entry_ids))
+    if len(entry_ids) > PLAYLIST_BATCH_MAX:
+        return jsonify({"error": f"Máximo {PLAYLIST_BATCH_MAX} canciones por petición"}), 400
+
+    if owned_playlist_id(playlist_id, user.id) is None:
+        return jsonify({"error": "Playlist no encontrada o sin permiso"}), 404
 
-        user_id_str = get_jwt_identity()
-        user_id = int(user_id_str)
+    try:
+        deleted = set(db.session.execute(delete_entries_statement(playlist_id, entry_ids)).scalars())
+        if deleted:
+            touch_playlist(playlist_id, user.id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error en remove_songs_from_playlist: {e}")
+        return jsonify({"error": "Error al eliminar canciones"}), 500
 
-        user = db.session.get(User, user_id)
+    results = [{"id": i, "status": "removed" if i in deleted else "not_found"} for i in entry_ids]
+    return jsonify({"removed": len(deleted), "not_found": len(entry_ids) - len(deleted), "results": results}), 200
 
-        if not user:
-            return jsonify({"error": "Usuario no encontrado"}), 404
+# OBTENER CANCIONES DE PLAYLISTS
 
-        playlist = db.session.execute(
-            db.select(Playlist).filter_by(id=playlist_id, user_id=user.id)
-        ).scalar_one_or_none()
+@api.route('/playlists/<int:playlist_id>/songs', methods=['GET'])
+@user_required
+def get_songs_in_playlist(playlist_id):
+    try:
 
-        if not playlist:
-            return jsonify({"error": "Playlist no encontrada o sin permiso"}), 404
+        user = current_principal()
 
-        songs = db.session.execute(
-            db.select(PlaylistSong).filter_by(playlist_id=playlist_id)
-        ).scalars().all()
+        version = playlist_version(playlist_id, user.id)
+        if version is None:
+            return jsonify({"error": "Playlist no encontrada o sin permiso"}), 404
 
-        # Serializar las canciones
-        songs_serialized = [s.serialize() for s in songs]
+        etag = playlist_etag('playlist-songs', playlist_id, version)
+        cached = not_modified(etag)
+        if cached:
+            return cached
 
-        return jsonify(songs_serialized), 200
+        # Se serializan según llegan de la base de datos
+        return with_etag(stream_query(playlist_songs_query(playlist_id), lambda s: s.serialize(), scalars=True), etag)
 
     except Exception as e:
         import traceback
@@ -440,21 +984,61 @@ def get_songs_in_playlist(playlist_id):
         return jsonify({"error": f"Error al traer las canciones: {str(e)}"}), 500
 
 
+# MOVER CANCION DENTRO DE LA PLAYLIST
+
+@api.route('/playlists/<int:playlist_id>/songs/<int:song_entry_id>/move', methods=['PATCH'])
+@user_required
+def move_song_in_playlist(playlist_id, song_entry_id):
+    """Coloca la entrada detrás de `after_id` o delante de `before_id` (null: principio/final).
+
+    Sólo se reescribe la posición de la entrada movida.
+    """
+    user = current_principal()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or ('after_id' in data) == ('before_id' in data):
+        return jsonify({"error": "Indica 'after_id' o 'before_id'"}), 400
+    after = 'after_id' in data
+    anchor_id = data['after_id' if after else 'before_id']
+    if anchor_id is not None and (not isinstance(anchor_id, int) or isinstance(anchor_id, bool)):
+        return jsonify({"error": "El id de referencia debe ser un entero o null"}), 400
+    if anchor_id == song_entry_id:
+        return jsonify({"error": "Una canción no se puede mover respecto a sí misma"}), 400
+
+    if owned_playlist_id(playlist_id, user.id) is None:
+        return jsonify({"error": "Playlist no encontrada o sin permiso"}), 404
+
+    entry_id = db.session.execute(
+        playlist_entry_query(playlist_id, song_entry_id, PlaylistSong.id)
+    ).scalar_one_or_none()
+    if entry_id is None:
+        return jsonify({"error": "Canción no encontrada en la playlist"}), 404
+
+    try:
+        position = positions.move_position(playlist_id, entry_id, anchor_id, after)
+        db.session.execute(
+            update(PlaylistSong).where(PlaylistSong.id == entry_id).values(position=position)
+        )
+        touch_playlist(playlist_id, user.id)
+        db.session.commit()
+    except LookupError:
+        db.session.rollback()
+        return jsonify({"error": "La canción de referencia no está en la playlist"}), 404
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error en move_song_in_playlist: {e}")
+        return jsonify({"error": "Error al mover la canción"}), 500
+
+    return jsonify({"id": entry_id, "position": position}), 200
+
+
 #ELIMINAR CANCION DE PLAYLISTS
 
 @api.route('/playlists/<int:playlist_id>/songs/<int:song_entry_id>', methods=['DELETE'])
-@jwt_required()
+@user_required
 def remove_song_from_playlist(playlist_id, song_entry_id):
     try:
         
-        user_id_str = get_jwt_identity()
-        user_id = int(user_id_str)
-
-       
-        user = db.session.get(User, user_id)
-
-        if not user:
-            return jsonify({"error": "Usuario no encontrado"}), 404
+        user = current_principal()
 
        
         playlist = db.session.execute(
@@ -466,7 +1050,7 @@ def remove_song_from_playlist(playlist_id, song_entry_id):
 
         
         song_entry = db.session.execute(
-            db.select(PlaylistSong).filter_by(id=song_entry_id, playlist_id=playlist_id)
+            playlist_entry_query(playlist_id, song_entry_id)
         ).scalar_one_or_none()
 
         if not song_entry:
@@ -474,6 +1058,7 @@ def remove_song_from_playlist(playlist_id, song_entry_id):
 
        
         db.session.delete(song_entry)
+        touch_playlist(playlist_id, user.id)
         db.session.commit()
 
         return jsonify({"message": "Canción eliminada de la playlist"}), 200
@@ -0,0 +1,174 @@
+"""
+Búsqueda de texto sobre `tracks`: el catálogo local y las canciones guardadas
+en playlists, que comparten esa tabla.
+
+En SQLite se usa una tabla virtual FTS5 mantenida por triggers, así que cada
+INSERT/UPDATE/DELETE en `tracks` (también los upserts por lotes) actualiza el
+índice en la misma transacción. En otros motores se cae a una búsqueda con LIKE.
+"""
+import re
+
+from sqlalchemy import String, cast, literal, or_, text
+
+from api.models import db, Track
+
+# rowid del índice: tracks.rowid * 2 (los impares eran de las antiguas copias en
+# playlist_songs); así cada trigger borra su fila por rowid sin escanear.
+# Un VACUUM puede renumerar tracks.rowid: después hay que ejecutar
+# `flask rebuild-search-index`
+FTS_SETUP = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS track_search USING fts5(
+        song_id UNINDEXED, source UNINDEXED, audio UNINDEXED, image UNINDEXED,
+        duration UNINDEXED, name, artist, album, genre,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    # Pesos bm25 por columna: nombre > artista > álbum > género
+    "INSERT INTO track_search(track_search, rank) VALUES ('rank', 'bm25(0, 0, 0, 0, 0, 10.0, 5.0, 2.0, 1.0)')",
+    """
+    CREATE TRIGGER IF NOT EXISTS tracks_search_ai AFTER INSERT ON tracks BEGIN
+        INSERT INTO track_search(rowid, song_id, source, audio, image, duration, name, artist, album, genre)
+        VALUES (new.rowid * 2, new.id, 'catalog', new.audio_url, new.image_url, new.duration,
+                new.name, new.artist, new.album_name, new.genres);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tracks_search_ad AFTER DELETE ON tracks BEGIN
+        DELETE FROM track_search WHERE rowid = old.rowid * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tracks_search_au AFTER UPDATE ON tracks BEGIN
+        DELETE FROM track_search WHERE rowid = old.rowid * 2;
+        INSERT INTO track_search(rowid, song_id, source, audio, image, duration, name, artist, album, genre)
+        VALUES (new.rowid * 2, new.id, 'catalog', new.audio_url, new.image_url, new.duration,
+                new.name, new.artist, new.album_name, new.genres);
+    END
+    """,
+]
+
+FTS_BACKFILL = [
+    """
+    INSERT INTO track_search(rowid, song_id, source, audio, image, duration, name, artist, album, genre)
+    SELECT rowid * 2, id, 'catalog', audio_url, image_url, duration, name, artist, album_name, genres
+    FROM tracks
+    """,
+]
+
+# Una fila por canción. Paginación por clave (score, song_id)
+FTS_QUERY = """
+    SELECT song_id, source, name, artist, album, genre, audio, image, duration, score
+    FROM (
+        SELECT song_id, source, name, artist, album, genre, audio, image, duration, rank AS score
+        FROM track_search WHERE track_search MATCH :query
+    )
+    WHERE :after_score IS NULL OR score > :after_score
+        OR (score = :after_score AND song_id > :after_id)
+    ORDER BY score, song_id
+    LIMIT :limit
+"""
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def is_fts_available():
+    return db.engine.dialect.name == "sqlite"
+
+
+def setup_search(app):
+    """Crea el índice FTS5 y sus triggers; lo rellena la primera vez"""
+    with app.app_context():
+        if not is_fts_available():
+            return
+        with db.engine.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'track_search'"
+            )).first()
+            for statement in FTS_SETUP:
+                conn.execute(text(statement))
+            if not exists:
+                for statement in FTS_BACKFILL:
+                    conn.execute(text(statement))
+
+
+def rebuild_search():
+    with db.engine.begin() as conn:
+        conn.execute(text("DELETE FROM track_search"))
+        for statement in FTS_BACKFILL:
+            conn.execute(text(statement))
+
+
+def fts_query(q):
+    """Convierte texto libre en una consulta FTS5 segura; la última palabra como prefijo"""
+    tokens = _TOKEN.findall(q)
+    if not tokens:
+        return None
+    quoted = [f'"{t}"' for t in tokens]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _row(row, score):
+    return {
+        "song_id": row.song_id,
+        "source": row.source,
+        "name": row.name,
+        "artist": row.artist,
+        "album_name": row.album or None,
+        "genre": row.genre,
+        "audio": row.audio,
+        "image": row.image,
+        "duration": row.duration,
+        "score": score,
+    }
+
+
+def search_tracks(q, limit=20, after_score=None, after_id=None):
+    """Devuelve (resultados, clave del último) ordenados por relevancia"""
+    if is_fts_available():
+        query = fts_query(q)
+        if query is None:
+            return [], None
+        rows = db.session.execute(text(FTS_QUERY), {
+            "query": query,
+            "after_score": after_score,
+            "after_id": after_id or "",
+            "limit": limit,
+        }).all()
+        results = [_row(r, r.score) for r in rows]
+    else:
+        if after_score not in (None, 0):
+            # El cursor viene de una página ordenada por relevancia: aquí no hay score
+            raise ValueError("Cursor de búsqueda no válido para la búsqueda por LIKE")
+        results = _search_like(q, limit, after_id)
+
+    last = (results[-1]["score"], results[-1]["song_id"]) if len(results) >= limit else None
+    return results, last
+
+
+def like_pattern(q):
+    """Patrón de subcadena para LIKE con los comodines del usuario escapados"""
+    escaped = q.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _search_like(q, limit, after_id):
+    """Alternativa sin índice para motores sin FTS5: coincidencias por nombre/artista.
+
+    No hay relevancia: todas las filas llevan score 0 y se pagina sólo por id,
+    así que el cursor es siempre (0, song_id).
+    """
+    pattern = like_pattern(q)
+    rows = db.session.execute(
+        db.select(
+            Track.id.label("song_id"), literal("catalog").label("source"), Track.name, Track.artist,
+            Track.album_name.label("album"), cast(Track.genres, String).label("genre"),
+            Track.audio_url.label("audio"), Track.image_url.label("image"), Track.duration,
+        )
+        .where(or_(Track.name.ilike(pattern, escape="\\"), Track.artist.ilike(pattern, escape="\\")),
+               Track.id > (after_id or ""))
+        .order_by(Track.id)
+        .limit(limit)
+    ).all()
+    return [_row(r, 0) for r in rows]
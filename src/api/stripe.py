@@ -79,7 +79,8 @@ def stripe_webhook():
             payload, sig_header, endpoint_secret)
         if event['type'] == 'checkout.session.completed':
             session = event['data']['object']
-            user_email = session['metadata'].get('email')
+            metadata = session['metadata'] or {}
+            user_email = metadata['email'] if 'email' in metadata else None
             if user_email:
                 user = db.session.execute(
                     db.select(User).filter_by(email=user_email)
@@ -0,0 +1,98 @@
+"""
+Emisión y rotación de tokens: access token corto + refresh token de un solo
+uso. Cada login abre una familia; reutilizar un refresh ya rotado revoca la
+familia entera (alguien más tiene una copia).
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from flask_jwt_extended import create_access_token, create_refresh_token, decode_token
+from sqlalchemy import select, update
+
+from api.models import db, RefreshToken
+from api.revocation import index as revocation_index
+
+# Margen para dos pestañas que refrescan a la vez con el mismo token
+REFRESH_REUSE_GRACE = timedelta(seconds=int(os.getenv("REFRESH_REUSE_GRACE_SECONDS", 10)))
+
+
+class RefreshTokenError(Exception):
+    def __init__(self, message, status_code=401):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _expires_at(token):
+    return datetime.utcfromtimestamp(decode_token(token, allow_expired=True)["exp"])
+
+
+def issue_tokens(user_id, family=None):
+    """Crea access + refresh para el usuario y registra el refresh. No hace commit"""
+    family = family or str(uuid.uuid4())
+    claims = {"fam": family}
+    access_token = create_access_token(identity=str(user_id), additional_claims=claims)
+    refresh_token = create_refresh_token(identity=str(user_id), additional_claims=claims)
+    refresh_payload = decode_token(refresh_token)
+    db.session.add(RefreshToken(
+        jti=refresh_payload["jti"],
+        family=family,
+        user_id=user_id,
+        access_jti=decode_token(access_token)["jti"],
+        expires_at=datetime.utcfromtimestamp(refresh_payload["exp"]),
+    ))
+    return access_token, refresh_token
+
+
+def rotate(refresh_payload):
+    """Canjea un refresh token por un par nuevo de la misma familia. No hace commit"""
+    jti = refresh_payload["jti"]
+    now = datetime.utcnow()
+    # Reclamo atómico: de dos refrescos simultáneos con el mismo token sólo uno actualiza la fila
+    claimed = db.session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.jti == jti, RefreshToken.used_at.is_(None), RefreshToken.revoked_at.is_(None))
+        .values(used_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    row = db.session.execute(
+        select(RefreshToken).where(RefreshToken.jti == jti).execution_options(populate_existing=True)
+    ).scalar_one_or_none()
+    if row is None or row.revoked_at is not None:
+        raise RefreshTokenError("Refresh token inválido")
+    if not claimed:
+        if now - row.used_at <= REFRESH_REUSE_GRACE:
+            raise RefreshTokenError("Refresh token ya utilizado", 409)
+        revoke_family(row.family)
+        raise RefreshTokenError("Refresh token reutilizado; sesión revocada")
+    return issue_tokens(row.user_id, family=row.family)
+
+
+def _revoke_rows(rows):
+    now = datetime.utcnow()
+    revoked = 0
+    for row in rows:
+        if row.revoked_at is not None:
+            continue
+        revoked += 1
+        row.revoked_at = now
+        revocation_index.revoke(row.jti, row.expires_at, row.user_id)
+        if row.access_jti:
+            # El access token caduca antes que el refresh; su caducidad sirve de cota
+            revocation_index.revoke(row.access_jti, row.expires_at, row.user_id)
+    return revoked
+
+
+def revoke_family(family):
+    rows = db.session.execute(
+        select(RefreshToken).where(RefreshToken.family == family, RefreshToken.expires_at > datetime.utcnow())
+    ).scalars().all()
+    return _revoke_rows(rows)
+
+
+def revoke_user_tokens(user_id):
+    rows = db.session.execute(
+        select(RefreshToken).where(RefreshToken.user_id == user_id, RefreshToken.expires_at > datetime.utcnow())
+    ).scalars().all()
+    return _revoke_rows(rows)
@@ -1,4 +1,11 @@
-from flask import jsonify, url_for
+import base64
+import json
+from flask import Response, current_app, jsonify, request, stream_with_context, url_for
+
+# Filas por viaje a la base de datos al hacer streaming (yield_per)
+STREAM_BATCH_SIZE = 500
+# Bytes acumulados antes de enviar un trozo de la respuesta
+STREAM_CHUNK_BYTES = 16 * 1024
 
 class APIException(Exception):
     status_code = 400
@@ -15,6 +22,122 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def encode_cursor(data):
+    """Cursor opaco para paginación a partir de un dict serializable"""
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    if not cursor:
+        return {}
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise APIException("Cursor inválido", 400)
+    if not isinstance(data, dict):
+        raise APIException("Cursor inválido", 400)
+    return data
+
+def violates_unique(error, table, name):
+    """¿El IntegrityError `error` viene de la restricción única `name` de `table`?
+
+    Postgres da el nombre de la restricción; SQLite sólo las columnas.
+    """
+    diag = getattr(error.orig, "diag", None)
+    if diag is not None:
+        return diag.constraint_name == name
+    constraint = next((c for c in table.constraints if c.name == name), None)
+    if constraint is None:
+        return False
+    columns = ", ".join(f"{table.name}.{column.name}" for column in constraint.columns)
+    return str(error.orig) == f"UNIQUE constraint failed: {columns}"
+
+def estimate_row_count(session, table_name):
+    """Número aproximado de filas sin recorrer la tabla.
+
+    Postgres: estadísticas del planner (pg_class.reltuples). SQLite: el rowid
+    máximo, que sobreestima si ha habido borrados.
+    """
+    from sqlalchemy import text
+
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        value = session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = :name"), {"name": table_name}
+        ).scalar()
+        if value is not None and value >= 0:
+            return int(value)
+    elif dialect == "sqlite":
+        return int(session.execute(text(f'SELECT coalesce(max(rowid), 0) FROM "{table_name}"')).scalar())
+    return int(session.execute(text(f'SELECT count(*) FROM "{table_name}"')).scalar())
+
+def wants_ndjson():
+    best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+    return best == "application/x-ndjson"
+
+def stream_json(items, serialize=None, status=200, headers=None):
+    """Response en streaming: array JSON, o NDJSON si el cliente lo pide con Accept.
+
+    Los elementos se serializan según llegan, sin construir la lista completa;
+    para consultas a la base de datos usar stream_query.
+    """
+    ndjson = wants_ndjson()
+    dumps = current_app.json.dumps
+
+    def generate():
+        buffer, size = [] if ndjson else ["["], 0
+        first = True
+        for item in items:
+            chunk = dumps(serialize(item) if serialize else item)
+            if ndjson:
+                chunk += "\n"
+            elif not first:
+                chunk = "," + chunk
+            first = False
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= STREAM_CHUNK_BYTES:
+                yield "".join(buffer)
+                buffer, size = [], 0
+        if not ndjson:
+            buffer.append("]\n")
+        if buffer:
+            yield "".join(buffer)
+
+    mimetype = "application/x-ndjson" if ndjson else "application/json"
+    response = Response(stream_with_context(generate()), status=status, mimetype=mimetype, headers=headers)
+    response.vary.add("Accept")
+    return response
+
+def not_modified(etag):
+    """Respuesta 304 si el If-None-Match del cliente incluye este ETag; si no, None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return with_etag(Response(status=304), etag)
+
+def with_etag(response, etag):
+    """ETag fuerte; el navegador guarda la respuesta pero revalida siempre con If-None-Match"""
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Accept")
+    response.vary.add("Authorization")
+    return response
+
+def stream_query(statement, serialize=None, scalars=False, status=200, headers=None):
+    """stream_json de una consulta que se ejecuta con yield_per mientras se envía.
+
+    La consulta se lanza dentro del generador: la sesión de la vista ya se ha
+    cerrado cuando empieza el streaming y stream_with_context abre otra.
+    """
+    from api.models import db
+
+    def rows():
+        result = db.session.execute(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+        yield from (result.scalars() if scalars else result)
+
+    return stream_json(rows(), serialize, status=status, headers=headers)
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
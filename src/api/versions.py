@@ -0,0 +1,53 @@
+"""
+Contadores de versión de las playlists para los ETags.
+
+Cada playlist tiene `version` y cada usuario `playlists_version` (el conjunto
+de sus playlists). Toda escritura que cambia lo que devuelven los GET los
+incrementa con un UPDATE atómico en la misma transacción, así que el ETag sale
+de una lectura por clave primaria sin cargar ni serializar canciones. Nada de
+aquí hace commit.
+"""
+from sqlalchemy import update
+
+from api.models import db, User, Playlist, PlaylistSong
+
+
+def touch_user(user_id):
+    """Incrementa la versión del conjunto de playlists del usuario y la devuelve"""
+    return db.session.execute(
+        update(User).where(User.id == user_id)
+        .values(playlists_version=User.playlists_version + 1)
+        .returning(User.playlists_version)
+    ).scalar_one()
+
+
+def touch_playlist(playlist_id, user_id):
+    """Una playlist ha cambiado: su versión y la del listado del usuario"""
+    db.session.execute(
+        update(Playlist).where(Playlist.id == playlist_id).values(version=Playlist.version + 1)
+    )
+    return touch_user(user_id)
+
+
+def playlists_containing(track_ids):
+    return (
+        db.select(PlaylistSong.playlist_id).distinct()
+        .where(PlaylistSong.track_id.in_(list(track_ids)))
+    )
+
+
+def touch_tracks(track_ids):
+    """Han cambiado datos de canciones compartidas: las playlists que las contienen"""
+    if not track_ids:
+        return
+    playlist_ids = playlists_containing(track_ids)
+    db.session.execute(
+        update(Playlist).where(Playlist.id.in_(playlist_ids)).values(version=Playlist.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        update(User)
+        .where(User.id.in_(db.select(Playlist.user_id).where(Playlist.id.in_(playlist_ids))))
+        .values(playlists_version=User.playlists_version + 1)
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,33 @@
+"""
+Waveforms compactos: reduce los peaks de Jamendo a N puntos cuantizados a uint8
+"""
+import json
+
+import numpy as np
+
+MIN_POINTS = 8
+MAX_POINTS = 2048
+DEFAULT_POINTS = 100
+
+
+def parse_peaks(raw):
+    """Extrae el array de peaks del waveform de Jamendo (string JSON o dict)"""
+    if not raw:
+        return None
+    data = json.loads(raw) if isinstance(raw, str) else raw
+    peaks = data.get("peaks") if isinstance(data, dict) else data
+    if not peaks:
+        return None
+    return np.abs(np.asarray(peaks, dtype=np.float32))
+
+
+def downsample(peaks, points):
+    """Máximo de cada tramo y escalado a 0-255"""
+    points = max(MIN_POINTS, min(points, MAX_POINTS))
+    if peaks.size > points:
+        starts = np.linspace(0, peaks.size, points, endpoint=False).astype(np.intp)
+        peaks = np.maximum.reduceat(peaks, starts)
+    top = peaks.max()
+    if top <= 0:
+        return np.zeros(peaks.size, dtype=np.uint8)
+    return np.rint(peaks * (255.0 / top)).astype(np.uint8)
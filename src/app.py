@@ -3,15 +3,22 @@ from sqlalchemy import select
 from flask_migrate import Migrate
 from datetime import datetime, timedelta, timezone
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_swagger import swagger
-from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
-from api.utils import APIException, generate_sitemap
-from api.models import db, User, Playlist, PlaylistSong
+from flask_jwt_extended import JWTManager, jwt_required, get_jwt
+from api.utils import APIException, generate_sitemap, estimate_row_count, stream_query
+from api.models import db, User, Playlist, PlaylistSong, hash_verification_token
 from api.routes import api
 from api.admin import setup_admin
 from api.commands import setup_commands
 from api.stripe import stripe_bp
+from api.catalog import refresher as catalog_refresher
+from api.search import setup_search
+from api.outbox import sender as outbox_sender, OUTBOX_WORKER_ENABLED
+from api.passwords import hasher, PasswordHasherBusy
+from api.ratelimit import rate_limit
+from api.identity import user_required, current_principal
+from api.tokens import issue_tokens, rotate, revoke_family, RefreshTokenError
+from api.revocation import index as revocation_index
 from flask_mail import Mail, Message
 import secrets
 from dotenv import load_dotenv
@@ -27,10 +34,10 @@ CORS(app, resources={
         "origins": [
             os.getenv("FRONTEND_URL", "http://localhost:5173"),
         ],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
+        "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+        "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
         "supports_credentials": True,
-        "expose_headers": ["Content-Type", "Authorization"]
+        "expose_headers": ["Content-Type", "Authorization", "X-Next-Cursor", "Link", "X-Resolved-Mood", "Retry-After", "X-Next-After-Id", "X-Total-Count-Estimate", "ETag"]
     }
 })
 
@@ -56,18 +63,31 @@ CORS(app, resources={
             "http://localhost:*",
             
         ],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "Access-Control-Allow-Origin"],
+        "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+        "allow_headers": ["Content-Type", "Authorization", "Access-Control-Allow-Origin", "If-None-Match"],
         "supports_credentials": True,
-        "expose_headers": ["Content-Type", "Authorization"]
+        "expose_headers": ["Content-Type", "Authorization", "X-Next-Cursor", "Link", "X-Resolved-Mood", "Retry-After", "X-Next-After-Id", "X-Total-Count-Estimate", "ETag"]
     }
 })
 
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///users.db"
+app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("SQLALCHEMY_DATABASE_URI", "sqlite:///users.db")
 app.config["JWT_SECRET_KEY"] = "super-secret-key"
-app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(days=7)
+app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=int(os.getenv("ACCESS_TOKEN_MINUTES", 15)))
+app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=int(os.getenv("REFRESH_TOKEN_DAYS", 30)))
 jwt = JWTManager(app)
 
+
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    # Sólo consulta el índice en memoria; no hay query por petición
+    return revocation_index.is_revoked(jwt_payload["jti"])
+
+
+@jwt.revoked_token_loader
+def revoked_token_callback(jwt_header, jwt_payload):
+    return jsonify({"error": "Token revocado"}), 401
+
+
 db.init_app(app)
 migrate = Migrate(app, db)
 
@@ -76,6 +96,19 @@ with app.app_context():
     print("Base de datos creada")
     setup_commands(app)
 
+catalog_refresher.init_app(app)
+setup_search(app)
+# El hilo emisor lo arranca quien sirve la web (wsgi.py, __main__); los comandos `flask ...` no
+outbox_sender.init_app(app, start=False)
+
+
+@app.before_request
+def start_outbox_worker():
+    # `flask run` no pasa por wsgi.py ni por __main__: la primera petición arranca el emisor
+    if OUTBOX_WORKER_ENABLED:
+        outbox_sender.start()
+
+
 app.register_blueprint(api, url_prefix='/api')
 app.register_blueprint(stripe_bp)
 
@@ -95,10 +128,56 @@ def health():
     return jsonify({"status": "ok"}), 200
 
 
+USERS_PAGE_SIZE = 100
+USERS_MAX_PAGE_SIZE = 1000
+# Campos públicos de User.serialize(); ?fields= elige un subconjunto
+USER_FIELDS = {
+    "id": User.id,
+    "full_name": User.full_name,
+    "username": User.username,
+    "email": User.email,
+    "date_of_birth": User.date_of_birth,
+    "email_verified": User.email_verified,
+}
+
+
 @app.route('/api/users', methods=['GET'])
 def get_users():
-    users = db.session.execute(db.select(User)).scalars().all()
-    return jsonify([user.serialize() for user in users]), 200
+    """Usuarios por orden de id, paginados por clave (?after_id=&limit=)"""
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = max(1, min(request.args.get('limit', USERS_PAGE_SIZE, type=int), USERS_MAX_PAGE_SIZE))
+
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()] or list(USER_FIELDS)
+    unknown = [f for f in fields if f not in USER_FIELDS]
+    if unknown:
+        raise APIException(f"Campos desconocidos: {', '.join(unknown)}", 400)
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+
+    columns = [USER_FIELDS[f] for f in fields]
+    # El id del último de la página y si existe uno más, con un recorrido acotado del índice
+    boundary = db.session.execute(
+        select(User.id).where(User.id > after_id).order_by(User.id).offset(limit - 1).limit(2)
+    ).scalars().all()
+
+    def serialize(row):
+        user = dict(zip(fields, row))
+        if user.get('date_of_birth'):
+            user['date_of_birth'] = user['date_of_birth'].isoformat()
+        return user
+
+    response = stream_query(
+        select(*columns).where(User.id > after_id).order_by(User.id).limit(limit), serialize)
+    if len(boundary) == 2:
+        next_after_id = boundary[0]
+        response.headers['X-Next-After-Id'] = str(next_after_id)
+        query = f"after_id={next_after_id}&limit={limit}"
+        if request.args.get('fields'):
+            query += f"&fields={','.join(fields)}"
+        response.headers['Link'] = f'<{request.base_url}?{query}>; rel="next"'
+    if request.args.get('count') == 'estimate':
+        response.headers['X-Total-Count-Estimate'] = str(estimate_row_count(db.session, User.__tablename__))
+    return response, 200
 
 
 @app.route('/api/verify-email/<token>', methods=['GET', 'OPTIONS'])
@@ -107,10 +186,8 @@ def verify_email(token):
         return jsonify({}), 200
 
     try:
-        print(f"Verificando token: {token}")
-
         user = db.session.execute(
-            db.select(User).filter_by(verification_token=token)
+            db.select(User).filter_by(verification_token_hash=hash_verification_token(token))
         ).scalar_one_or_none()
 
         if not user:
@@ -137,6 +214,11 @@ def verify_email(token):
 
 
 @app.route('/api/token', methods=['POST', 'OPTIONS'])
+@rate_limit(
+    "login",
+    per_ip=os.getenv("LOGIN_RATE_LIMIT_IP", "30/minute"),
+    per_account=os.getenv("LOGIN_RATE_LIMIT_ACCOUNT", "10/minute"),
+)
 def login_user():
     if request.method == 'OPTIONS':
         return jsonify({}), 200
@@ -158,10 +240,18 @@ def login_user():
 
         print(f"User found: {user.email}, checking password...")
 
-        if not check_password_hash(user.password_hash, password):
+        if not hasher.check(user.password_hash, password):
             print("Password verification failed")
             return jsonify({"message": "Credenciales inválidas"}), 401
 
+        # Actualiza hashes con parámetros antiguos ahora que tenemos la contraseña
+        if hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = hasher.hash(password)
+                db.session.commit()
+            except PasswordHasherBusy:
+                db.session.rollback()
+
         if not user.email_verified:
             return jsonify({
                 "message": "Por favor verifica tu email antes de iniciar sesión",
@@ -170,13 +260,15 @@ def login_user():
                 "requires_verification": True
             }), 403
 
-        token = create_access_token(identity=str(user.id))
+        token, refresh_token = issue_tokens(user.id)
+        db.session.commit()
 
         expires_in = int(
             app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds())
         return jsonify({
             "message": "Login exitoso",
             "access_token": token,
+            "refresh_token": refresh_token,
             "token_type": "bearer",
             "expires_in": expires_in,
             "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=expires_in)).isoformat(),
@@ -189,17 +281,51 @@ def login_user():
             }
         }), 200
 
+    except PasswordHasherBusy as e:
+        return jsonify({"message": e.message}), 503
     except Exception as e:
+        db.session.rollback()
         print(f'Error durante el login: {e}')
         return jsonify({"message": "Ocurrió un error durante el login"}), 500
 
+
+@app.route('/api/token/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh_token():
+    try:
+        access_token, new_refresh_token = rotate(get_jwt())
+        db.session.commit()
+    except RefreshTokenError as e:
+        # La revocación de la familia por reutilización también hay que guardarla
+        db.session.commit()
+        return jsonify({"message": e.message}), e.status_code
+
+    expires_in = int(app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds())
+    return jsonify({
+        "access_token": access_token,
+        "refresh_token": new_refresh_token,
+        "token_type": "bearer",
+        "expires_in": expires_in,
+        "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=expires_in)).isoformat(),
+    }), 200
+
+
+@app.route('/api/logout', methods=['POST'])
+@jwt_required(verify_type=False)
+def logout():
+    payload = get_jwt()
+    revocation_index.revoke(
+        payload["jti"], datetime.utcfromtimestamp(payload["exp"]), int(payload["sub"]))
+    if payload.get("fam"):
+        revoke_family(payload["fam"])
+    db.session.commit()
+    return jsonify({"message": "Sesión cerrada"}), 200
+
+
 @app.route('/api/refresh-session', methods=['GET'])
-@jwt_required()
+@user_required
 def refresh_session():
-    user_id = get_jwt_identity()
-    user = db.session.execute(db.select(User).filter_by(id=user_id)).scalar_one_or_none()
-    if not user:
-        return jsonify({"error": "Usuario no encontrado"}), 404
+    user = current_principal()
     return jsonify({
         "user": {
             "id": user.id,
@@ -212,18 +338,10 @@ def refresh_session():
 
 
 @app.route('/api/protected', methods=['GET'])
-@jwt_required()
+@user_required
 def protected():
-    user_id = get_jwt_identity()
-    user = db.session.execute(
-        db.select(User).filter_by(id=user_id)
-    ).scalar_one_or_none()
-    email = user.email if user else "Usuario"
-    return jsonify({"message": f"Hola, {email}"}), 200
-
-
-if __name__ == '__main__':
-    app.run(debug=True, port=3001, host='0.0.0.0')
+    user = current_principal()
+    return jsonify({"message": f"Hola, {user.email}"}), 200
 
 
 @jwt.expired_token_loader
@@ -237,4 +355,10 @@ def invalid_token_callback(error):
 
 @jwt.unauthorized_loader
 def missing_authorization_callback(error):
-    return jsonify({"error": "Se requiere token de autorización"}), 401
\ No newline at end of file
+    return jsonify({"error": "Se requiere token de autorización"}), 401
+
+
+if __name__ == '__main__':
+    if OUTBOX_WORKER_ENABLED:
+        outbox_sender.start()
+    app.run(debug=True, port=3001, host='0.0.0.0')
@@ -0,0 +1,75 @@
+// Renueva el access token (corto) con el refresh token cuando una llamada
+// autenticada a la API devuelve 401, y reintenta la petición una vez.
+// Varias peticiones que fallan a la vez comparten un único refresh.
+// Si otra pestaña ha rotado el refresh token justo antes, el backend responde
+// 409 (REFRESH_REUSE_GRACE): no es un logout, los tokens nuevos llegan por
+// localStorage y se reintenta con ellos.
+
+const API_BASE = (import.meta.env.VITE_BACKEND_URL || "").replace(/\/+$/, "");
+const originalFetch = window.fetch.bind(window);
+let refreshing = null;
+
+const REUSE_RETRY_DELAYS = [0, 250, 500, 1000]; // ms, dentro de la ventana de gracia
+
+const tokenRotatedElsewhere = async (usedRefreshToken) => {
+  for (const delay of REUSE_RETRY_DELAYS) {
+    if (delay) await new Promise((resolve) => setTimeout(resolve, delay));
+    const current = localStorage.getItem("refresh_token");
+    if (current && current !== usedRefreshToken) return localStorage.getItem("token");
+  }
+  return null;
+};
+
+const refreshAccessToken = () => {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem("refresh_token");
+    refreshing = (async () => {
+      if (!refreshToken) return null;
+      const res = await originalFetch(`${API_BASE}/api/token/refresh`, {
+        method: "POST",
+        headers: { Authorization: `Bearer ${refreshToken}` },
+      });
+      if (res.status === 409) return tokenRotatedElsewhere(refreshToken);
+      if (!res.ok) {
+        localStorage.removeItem("token");
+        localStorage.removeItem("refresh_token");
+        return null;
+      }
+      const data = await res.json();
+      localStorage.setItem("token", data.access_token);
+      localStorage.setItem("refresh_token", data.refresh_token);
+      return data.access_token;
+    })().finally(() => {
+      refreshing = null;
+    });
+  }
+  return refreshing;
+};
+
+const bearerOf = (headers) => {
+  const value = headers instanceof Headers
+    ? headers.get("Authorization")
+    : headers && (headers.Authorization || headers.authorization);
+  return value && value.startsWith("Bearer ") ? value : null;
+};
+
+window.fetch = async (input, init = {}) => {
+  const response = await originalFetch(input, init);
+  const url = typeof input === "string" ? input : input.url;
+  if (
+    response.status !== 401 ||
+    !url.includes("/api/") ||
+    url.includes("/api/token") ||
+    url.includes("/api/logout") ||
+    !bearerOf(init.headers)
+  ) {
+    return response;
+  }
+
+  const token = await refreshAccessToken();
+  if (!token) return response;
+
+  const headers = new Headers(init.headers);
+  headers.set("Authorization", `Bearer ${token}`);
+  return originalFetch(input, { ...init, headers });
+};
@@ -79,10 +79,11 @@ const LoginModal = ({ show, onClose, onLoginSuccess, onSwitchToRegister }) => {
       console.log('📡 Respuesta del login:', data);
 
       if (response.ok) {
-        const { access_token, user } = data;
+        const { access_token, refresh_token, user } = data;
 
         localStorage.setItem('token', access_token);
-        dispatch({ type: 'LOGIN_SUCCESS', payload: { user, access_token } });
+        localStorage.setItem('refresh_token', refresh_token);
+        dispatch({ type: 'LOGIN_SUCCESS', payload: { user, access_token, refresh_token } });
 
         if (onLoginSuccess) {
           onLoginSuccess(data.user);
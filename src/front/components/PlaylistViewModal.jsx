@@ -25,33 +25,8 @@ const PlaylistViewModal = ({ isOpen, onClose, playlistId, playlistName }) => {
         });
     }, [showSuccess, showError, openPlayer]);
 
-    const fetchPlaylistInfo = async () => {
-        try {
-            const token = localStorage.getItem("token");
-
-            const res = await fetch(`${import.meta.env.VITE_BACKEND_URL}/api/playlists`, {
-                headers: {
-                    Authorization: `Bearer ${token}`,
-                },
-            });
-
-            if (!res.ok) throw new Error("Error al traer playlists");
-
-            const playlists = await res.json();
-            const currentPlaylist = (Array.isArray(playlists) ? playlists : []).find(
-                p => p.id === Number(playlistId) 
-            );
-
-            if (currentPlaylist) {
-                setPlaylistInfo(currentPlaylist);
-            }
-        } catch (err) {
-            console.error("Error al obtener info de playlist:", err);
-            setPlaylistInfo({ name: playlistName || `Playlist #${playlistId}` });
-        }
-    };
-
-    const fetchSongs = async () => {
+    // Una sola petición: datos de la playlist, totales y canciones
+    const fetchPlaylist = async () => {
         if (!playlistId || !isOpen) return;
 
         setLoading(true);
@@ -59,19 +34,21 @@ const PlaylistViewModal = ({ isOpen, onClose, playlistId, playlistName }) => {
 
         try {
             const token = localStorage.getItem("token");
-            const res = await fetch(`${import.meta.env.VITE_BACKEND_URL}/api/playlists/${playlistId}/songs`, {
+            const res = await fetch(`${import.meta.env.VITE_BACKEND_URL}/api/playlists/${playlistId}`, {
                 headers: {
                     Authorization: `Bearer ${token}`,
                 },
             });
 
-            if (!res.ok) throw new Error("Error al traer las canciones");
+            if (!res.ok) throw new Error("Error al traer la playlist");
 
-            const data = await res.json();
-            setSongs(data);
+            const { songs: playlistSongs, ...info } = await res.json();
+            setPlaylistInfo(info);
+            setSongs(Array.isArray(playlistSongs) ? playlistSongs : []);
         } catch (err) {
             setError(err.message);
             setSongs([]);
+            setPlaylistInfo({ name: playlistName || `Playlist #${playlistId}` });
             showError("Error al cargar las canciones de la playlist");
         } finally {
             setLoading(false);
@@ -80,8 +57,7 @@ const PlaylistViewModal = ({ isOpen, onClose, playlistId, playlistName }) => {
 
     useEffect(() => {
         if (isOpen && playlistId) {
-            fetchPlaylistInfo();
-            fetchSongs();
+            fetchPlaylist();
         }
     }, [playlistId, isOpen]);
 
@@ -0,0 +1,26 @@
+import PropTypes from "prop-types";
+
+// Waveform reducido que sirve el backend (uint8, 0-255); Results los pide por página en /api/music/waveforms
+const WaveformMini = ({ peaks }) => {
+    if (!Array.isArray(peaks)) return null;
+
+    return (
+        <div style={{ transform: 'translateX(-200px)' }} className="waveform-mini">
+            {peaks.map((value, i) => (
+                <div
+                    key={i}
+                    className="wave-bar-mini"
+                    style={{
+                        height: `${Math.max(4, (value / 255) * 60)}px`,
+                    }}
+                />
+            ))}
+        </div>
+    );
+};
+
+export default WaveformMini;
+
+WaveformMini.propTypes = {
+    peaks: PropTypes.arrayOf(PropTypes.number)
+};
@@ -4,6 +4,7 @@ import './index.css';
 import './navBar-Modal.css';
 import './player.css';
 import 'animate.css';
+import './authFetch';
 import { RouterProvider } from 'react-router-dom';
 import { StoreProvider } from './hooks/useGlobalReducer';
 import { PlayerProvider } from './hooks/PlayerContext';
@@ -6,6 +6,7 @@ import { FaPlay, FaPlus } from "react-icons/fa";
 import "../results.css";
 import { addSongToPlaylist, createUserPlaylist, getUserPlaylistsWithGuaranteedCounts } from "../store";
 import NewPlaylistModal from "../components/NewPlaylistModal";
+import WaveformMini from "../components/WaveformMini";
 import "../NewPlaylistModal.css";
 import { createPortal } from "react-dom";
 import useGlobalReducer from "../hooks/useGlobalReducer";
@@ -20,6 +21,9 @@ const moodVideos = {
   latin: "src/front/public/videos/latino.mp4",
 };
 
+const WAVEFORM_POINTS = 40;
+const WAVEFORM_BATCH_SIZE = 50; // WAVEFORM_BATCH_MAX en el backend
+
 const Results = () => {
   const location = useLocation();
   const moodObj = location.state?.moodObj;
@@ -28,6 +32,9 @@ const Results = () => {
 
   const [tracks, setTracks] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [waveforms, setWaveforms] = useState({});
   const { openPlayer } = usePlayer();
   const { showSuccess, showError, showWarning } = useNotifications();
 
@@ -125,8 +132,12 @@ const Results = () => {
     if (!mood) return;
     
     setLoading(true);
+    setNextCursor(null);
     fetch(`/api/music/mood/${mood}`)
-      .then((res) => res.json())
+      .then((res) => {
+        setNextCursor(res.headers.get("X-Next-Cursor"));
+        return res.json();
+      })
       .then((data) => {
         setTracks(data);
         setLoading(false);
@@ -138,6 +149,55 @@ const Results = () => {
       });
   }, [mood, showError]);
 
+  // Waveforms de las canciones nuevas: una petición por página, no una por canción
+  const requestedWaveforms = useRef(new Set());
+  useEffect(() => {
+    const ids = tracks.map(t => String(t.id)).filter(id => !requestedWaveforms.current.has(id));
+    if (ids.length === 0) return;
+    ids.forEach(id => requestedWaveforms.current.add(id));
+
+    for (let i = 0; i < ids.length; i += WAVEFORM_BATCH_SIZE) {
+      const batch = ids.slice(i, i + WAVEFORM_BATCH_SIZE);
+      fetch(`/api/music/waveforms?points=${WAVEFORM_POINTS}&ids=${batch.map(encodeURIComponent).join(",")}`)
+        .then((res) => (res.ok ? res.json() : []))
+        .then((data) => {
+          setWaveforms(prev => {
+            const next = { ...prev };
+            data.forEach(w => { next[w.id] = w.peaks; });
+            return next;
+          });
+        })
+        .catch((err) => console.error("Waveform error:", err));
+    }
+  }, [tracks]);
+
+  // Scroll infinito: pedimos la siguiente página al acercarnos al final
+  useEffect(() => {
+    if (!nextCursor || loadingMore) return;
+
+    const handleScrollEnd = () => {
+      if (window.innerHeight + window.scrollY < document.body.offsetHeight - 300) return;
+
+      setLoadingMore(true);
+      fetch(`/api/music/mood/${mood}?cursor=${encodeURIComponent(nextCursor)}`)
+        .then((res) => {
+          setNextCursor(res.headers.get("X-Next-Cursor"));
+          return res.json();
+        })
+        .then((data) => {
+          setTracks(prev => {
+            const seen = new Set(prev.map(t => t.id));
+            return [...prev, ...data.filter(t => !seen.has(t.id))];
+          });
+        })
+        .catch((err) => console.error("Error al traer más música:", err))
+        .finally(() => setLoadingMore(false));
+    };
+
+    window.addEventListener('scroll', handleScrollEnd);
+    return () => window.removeEventListener('scroll', handleScrollEnd);
+  }, [mood, nextCursor, loadingMore]);
+
   const handleEscuchar = (track) => {
     const trackData = {
       id: track.id,
@@ -149,7 +209,6 @@ const Results = () => {
       genre: track.genres,
       album_name: track.album_name,
       release_date: track.release_date,
-      waveform: track.waveform,
       genres: track.genres,
     };
 
@@ -163,7 +222,6 @@ const Results = () => {
       genre: t.genres,
       album_name: t.album_name,
       release_date: t.release_date,
-      waveform: t.waveform,
       genres: t.genres,
     }));
 
@@ -296,32 +354,7 @@ const Results = () => {
                   <p className="duration">{formatDuration(track.duration)}</p>
                 </div>
 
-                {(() => {
-                  try {
-                    const waveformObj = typeof track.waveform === "string"
-                      ? JSON.parse(track.waveform)
-                      : track.waveform;
-
-                    const peaks = waveformObj?.peaks;
-
-                    return Array.isArray(peaks) ? (
-                      <div style={{ transform: 'translateX(-200px)' }} className="waveform-mini">
-                        {peaks.slice(0, 40).map((value, i) => (
-                          <div
-                            key={i}
-                            className="wave-bar-mini"
-                            style={{
-                              height: `${Math.max(4, value * 0.6)}px`,
-                            }}
-                          />
-                        ))}
-                      </div>
-                    ) : null;
-                  } catch (e) {
-                    console.error("Waveform parse error:", e);
-                    return null;
-                  }
-                })()}
+                <WaveformMini peaks={waveforms[String(track.id)]} />
 
                 <FaPlay onClick={() => handleEscuchar(track)} className="icon" />
 
@@ -336,6 +369,7 @@ const Results = () => {
                 </div>
               </div>
             ))}
+            {loadingMore && <p className="results-loading">Loading more music...</p>}
           </div>
         )}
       </div>
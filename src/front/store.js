@@ -32,6 +32,9 @@ export default function storeReducer(state, action) {
     case "LOGIN_SUCCESS":
       localStorage.setItem("user", JSON.stringify(action.payload.user));
       localStorage.setItem("token", action.payload.access_token);
+      if (action.payload.refresh_token) {
+        localStorage.setItem("refresh_token", action.payload.refresh_token);
+      }
 
       return {
         ...state,
@@ -77,6 +80,7 @@ export default function storeReducer(state, action) {
 
     case "LOGOUT":
       localStorage.removeItem("token");
+      localStorage.removeItem("refresh_token");
       localStorage.removeItem("user");
       return {
         ...state,
@@ -136,6 +140,23 @@ export default function storeReducer(state, action) {
   }
 }
 
+// Revoca la sesión en el backend antes de borrar el estado local; con el
+// refresh token se revoca toda la familia aunque el access ya haya caducado
+export async function logoutUser(dispatch) {
+  const token = localStorage.getItem("refresh_token") || localStorage.getItem("token");
+  if (token) {
+    try {
+      await fetch(`${API_BASE}/api/logout`, {
+        method: "POST",
+        headers: { Authorization: `Bearer ${token}` },
+      });
+    } catch (error) {
+      console.error("Error al cerrar sesión en el servidor:", error);
+    }
+  }
+  dispatch({ type: "LOGOUT" });
+}
+
 export async function refreshUserSession(dispatch) {
   const token = localStorage.getItem("token");
   if (!token) return false;
@@ -153,7 +174,7 @@ export async function refreshUserSession(dispatch) {
     );
 
     if (response.status === 401 || response.status === 422) {
-      dispatch({ type: "LOGOUT" });
+      await logoutUser(dispatch);
       return false;
     }
 
@@ -508,6 +529,10 @@ export const getUserPlaylistsWithSongCounts = async (token) => {
             return playlist;
           }
 
+          if (playlist.song_count !== undefined) {
+            return { ...playlist, songCount: playlist.song_count, hasRealCount: true };
+          }
+
           if (playlist.songs && Array.isArray(playlist.songs)) {
             return {
               ...playlist,
@@ -556,118 +581,20 @@ export const getUserPlaylistsWithSongCounts = async (token) => {
  */
 export const getUserPlaylistsWithGuaranteedCounts = async (token) => {
   try {
-    console.log("🔍 Getting playlists with GUARANTEED counts...");
-
-    // Paso 1: Obtener las playlists básicas
+    // /api/playlists ya trae song_count y total_duration calculados en el servidor
     const playlists = await getUserPlaylists(token);
 
     if (!playlists || !Array.isArray(playlists) || playlists.length === 0) {
-      console.log("🔍 No playlists found");
       return [];
     }
 
-    console.log(
-      `🔍 Found ${playlists.length} playlists, getting song counts...`
-    );
-
-    // Paso 2: Para cada playlist, obtener el conteo REAL de canciones
-    const playlistsWithGuaranteedCounts = await Promise.all(
-      playlists.map(async (playlist, index) => {
-        try {
-          console.log(
-            `🔍 [${index + 1}/${playlists.length}] Getting songs for: ${
-              playlist.name
-            }`
-          );
-
-          // Solo usar el endpoint que funciona
-          const endpoints = [
-            `${import.meta.env.VITE_BACKEND_URL}/api/playlists/${
-              playlist.id
-            }/songs`,
-          ];
-
-          let songs = [];
-          let success = false;
-
-          for (const endpoint of endpoints) {
-            try {
-              console.log(`🔍 Trying endpoint: ${endpoint}`);
-
-              const response = await fetch(endpoint, {
-                method: "GET",
-                headers: {
-                  Authorization: `Bearer ${token}`,
-                  "Content-Type": "application/json",
-                },
-              });
-
-              if (response.ok) {
-                const data = await response.json();
-                console.log(`🔍 Response for ${playlist.name}:`, data);
-
-                // Manejar diferentes formatos de respuesta
-                if (Array.isArray(data)) {
-                  songs = data;
-                } else if (data && Array.isArray(data.songs)) {
-                  songs = data.songs;
-                } else if (data && Array.isArray(data.data)) {
-                  songs = data.data;
-                } else {
-                  songs = [];
-                }
-
-                success = true;
-                console.log(
-                  `✅ Found ${songs.length} songs for "${playlist.name}"`
-                );
-                break;
-              } else {
-                console.log(
-                  `❌ Endpoint failed: ${response.status} ${response.statusText}`
-                );
-              }
-            } catch (endpointError) {
-              console.log(`❌ Endpoint error:`, endpointError.message);
-              continue;
-            }
-          }
-
-          const finalSongCount = songs.length;
-
-          return {
-            ...playlist,
-            songCount: finalSongCount,
-            songs: songs, // Incluir las canciones para referencia
-            hasRealCount: success,
-            lastCountUpdate: Date.now(),
-          };
-        } catch (error) {
-          console.error(
-            `❌ Error getting songs for playlist ${playlist.name}:`,
-            error
-          );
-          return {
-            ...playlist,
-            songCount: 0,
-            songs: [],
-            hasRealCount: false,
-            lastCountUpdate: Date.now(),
-          };
-        }
-      })
-    );
-
-    console.log("🎯 Final playlists with guaranteed counts:");
-    playlistsWithGuaranteedCounts.forEach((playlist) => {
-      console.log(
-        `🎯 "${playlist.name}": ${playlist.songCount} canciones (${
-          playlist.hasRealCount ? "REAL" : "FALLBACK"
-        })`
-      );
-    });
-
-    return playlistsWithGuaranteedCounts;
+    return playlists.map((playlist) => ({
+      ...playlist,
+      songCount: playlist.song_count ?? 0,
+      totalDuration: playlist.total_duration ?? 0,
+      hasRealCount: playlist.song_count !== undefined,
+      lastCountUpdate: Date.now(),
+    }));
   } catch (error) {
     console.error("❌ Error in getUserPlaylistsWithGuaranteedCounts:", error);
     return [];
@@ -2,6 +2,10 @@
 # Read more about it here: https://devcenter.heroku.com/articles/python-gunicorn
 
 from app import app as application
+from api.outbox import sender as outbox_sender, OUTBOX_WORKER_ENABLED
+
+if OUTBOX_WORKER_ENABLED:
+    outbox_sender.start()
 
 if __name__ == "__main__":
     application.run()
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos de la app se importan como `api.*`, igual que con `flask run` desde src/;
+# bench/ aporta los stubs (FakeJamendo, SMTPSink)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+@pytest.fixture
+def app():
+    from flask import Flask
+    from api.models import db
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,71 @@
+import json
+import os
+
+from sqlalchemy import func, select
+
+from api import catalog
+from api.commands import setup_commands
+from api.models import db, Track, TrackTag
+from api.utils import decode_cursor
+
+from conftest import FIXTURES
+
+TRACKS_FIXTURE = os.path.join(FIXTURES, "jamendo_tracks.json")
+
+
+def ingest(app, *args):
+    setup_commands(app)
+    result = app.test_cli_runner().invoke(args=["ingest-tracks", "--file", TRACKS_FIXTURE, *args])
+    assert result.exit_code == 0, result.output
+    return result
+
+
+def test_ingest_tracks_from_fixture_file(app):
+    ingest(app, "--batch-size", "2")
+    # Repetir la ingesta no duplica nada
+    ingest(app, "--batch-size", "2")
+
+    assert db.session.execute(select(func.count()).select_from(Track)).scalar() == 4
+    # La última aparición de una canción en el fichero gana
+    assert db.session.get(Track, "101").name == "Track 101 (remaster)"
+    tags = db.session.execute(
+        select(TrackTag.tag, TrackTag.kind).where(TrackTag.track_id == "101")
+    ).all()
+    assert sorted(tags) == [("chill", "vartag"), ("happy", "vartag"), ("piano", "instrument"), ("pop", "genre")]
+
+    happy = catalog.tracks_for_mood("happy", limit=10)
+    assert [t["id"] for t in happy] == ["104", "102", "101"]
+    assert "waveform" not in happy[0]
+
+
+def test_mood_scroll_moves_to_jamendo_without_repeating_catalog_tracks(app, monkeypatch):
+    from api import routes
+
+    with open(TRACKS_FIXTURE) as f:
+        catalog.upsert_tracks(json.load(f)["results"])
+    app.register_blueprint(routes.api, url_prefix="/api")
+
+    # Jamendo ordena por relevancia: incluye canciones que ya salieron del catálogo
+    upstream = ["102", "200", "101", "201", "202", "104", "203"]
+
+    def fake_page(params):
+        offset = params.get("offset", 0)
+        return [{"id": i} for i in upstream[offset:offset + params["limit"]]]
+
+    monkeypatch.setattr(routes, "get_mood_page", fake_page)
+    monkeypatch.setattr(routes, "MOOD_PREFETCH", False)
+
+    client = app.test_client()
+    seen, sources, cursor = [], [], None
+    for _ in range(10):
+        query = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/music/mood/happy", query_string=query)
+        assert response.status_code == 200
+        seen += [t["id"] for t in response.get_json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        sources.append(decode_cursor(cursor)["src"])
+
+    assert sources[0] == "catalog" and sources[-1] == "jamendo"
+    assert seen == ["104", "102", "101", "200", "201", "202", "203"]
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from api.jamendo import CircuitBreaker, CircuitOpenError, JamendoClient, JamendoError
+from stubs import FakeJamendo
+
+
+@pytest.fixture
+def stub():
+    stub = FakeJamendo(latency_ms=0, jitter_ms=0, catalog_size=50).start()
+    yield stub
+    stub.stop()
+
+
+def make_client(stub, threshold=2, reset=0.2, retries=2):
+    return JamendoClient(base_url=stub.url, max_retries=retries, backoff=0,
+                         breaker=CircuitBreaker(failure_threshold=threshold, reset_timeout=reset))
+
+
+def test_returns_results_and_splits_multi_id_lookups(stub):
+    client = make_client(stub)
+    assert [t["id"] for t in client.tracks(id="3 7", limit=2)] == ["3", "7"]
+    assert client.breaker.stats() == {"state": "closed", "failures": 0}
+
+
+def test_retries_5xx_and_counts_one_failure_per_call(stub):
+    stub.error_rate = 1.0
+    client = make_client(stub, threshold=5, retries=2)
+    with pytest.raises(JamendoError):
+        client.tracks(limit=1)
+    assert stub.requests == 3
+    assert client.breaker.stats() == {"state": "closed", "failures": 1}
+
+
+def test_4xx_is_not_retried_and_does_not_trip_the_breaker(stub):
+    client = make_client(stub, threshold=1)
+    with pytest.raises(JamendoError):
+        client.get("missing")
+    assert stub.requests == 1
+    assert client.breaker.stats() == {"state": "closed", "failures": 0}
+
+
+def test_breaker_opens_then_half_open_trial_decides(stub):
+    stub.error_rate = 1.0
+    client = make_client(stub, threshold=2, retries=0)
+    for _ in range(2):
+        with pytest.raises(JamendoError):
+            client.tracks(limit=1)
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    # Abierto: falla sin llegar al servidor
+    requests_before = stub.requests
+    with pytest.raises(CircuitOpenError):
+        client.tracks(limit=1)
+    assert stub.requests == requests_before
+
+    # La prueba half-open falla: vuelve a abrirse
+    time.sleep(0.25)
+    with pytest.raises(JamendoError):
+        client.tracks(limit=1)
+    assert stub.requests == requests_before + 1
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    # La siguiente prueba sale bien: se cierra
+    stub.error_rate = 0.0
+    time.sleep(0.25)
+    assert client.tracks(limit=1)
+    assert client.breaker.stats() == {"state": "closed", "failures": 0}
+
+
+def test_half_open_lets_a_single_trial_through(stub):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record_success()
+    assert breaker.allow() is True
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+
+from api.maintenance import purge_unverified_users
+from api.models import db, User
+
+
+def make_user(name, created_days_ago, token_expires=None, verified=False):
+    user = User(
+        full_name=name,
+        username=name,
+        email=f"{name}@example.com",
+        password_hash="x",
+        email_verified=verified,
+        created_at=datetime.utcnow() - timedelta(days=created_days_ago),
+        verification_token_hash=name if token_expires else None,
+        verification_token_expires=token_expires,
+    )
+    db.session.add(user)
+    return user
+
+
+def usernames():
+    return {user.username for user in db.session.execute(db.select(User)).scalars()}
+
+
+def test_purge_keeps_old_unverified_account_with_live_token(app):
+    now = datetime.utcnow()
+    make_user("stale", 30)
+    make_user("stale_expired_token", 30, token_expires=now - timedelta(hours=1))
+    make_user("resent", 30, token_expires=now + timedelta(hours=23))
+    make_user("recent", 1)
+    make_user("verified", 30, verified=True)
+    db.session.commit()
+
+    assert purge_unverified_users(batch_size=1, days=7) == 2
+    assert usernames() == {"resent", "recent", "verified"}
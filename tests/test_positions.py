@@ -0,0 +1,80 @@
+import pytest
+
+from api import positions
+from api.models import db, User, Playlist, PlaylistSong, Track
+from api.positions import _midpoint, key_after, key_between, spaced_keys, APPEND_WIDTH, FIRST_KEY
+
+
+@pytest.mark.parametrize("a, b", [
+    ("", "i"), ("i", "j"), ("i", "i1"), ("a", "b"), ("az", "b"), ("i", None), ("zz", None), ("", "01"),
+])
+def test_midpoint_is_strictly_between(a, b):
+    key = _midpoint(a, b)
+    assert a < key
+    if b is not None:
+        assert key < b
+    assert not key.endswith("0")
+
+
+def test_key_after_appends_without_growing():
+    assert key_after(None) == FIRST_KEY
+    keys = [FIRST_KEY]
+    for _ in range(1000):
+        keys.append(key_after(keys[-1]))
+    assert keys == sorted(keys) and len(set(keys)) == len(keys)
+    assert max(len(k) for k in keys) <= APPEND_WIDTH
+
+
+def test_key_after_overflow_extends_the_key():
+    key = "z" * APPEND_WIDTH
+    assert key_after(key) > key
+
+
+def test_spaced_keys_are_ordered_and_leave_room_at_the_end():
+    for count in (1, 2, 10, 5000):
+        keys = spaced_keys(count)
+        assert len(keys) == count
+        assert keys == sorted(keys) and len(set(keys)) == count
+        assert key_after(keys[-1]) > keys[-1]
+
+
+def test_key_between_rejects_ties_and_inversions():
+    with pytest.raises(ValueError):
+        key_between("i", "i")
+    with pytest.raises(ValueError):
+        key_between("j", "i")
+
+
+def make_playlist(*keys):
+    db.session.add(User(id=1, full_name="u", username="u", email="u@example.com", password_hash="x"))
+    db.session.add(Playlist(id=1, user_id=1, name="p"))
+    for i, key in enumerate(keys, start=1):
+        db.session.add(Track(id=str(i), name=f"t{i}", artist="a", audio_url="u"))
+        db.session.add(PlaylistSong(id=i, playlist_id=1, track_id=str(i), position=key))
+    db.session.commit()
+
+
+def order():
+    return db.session.execute(
+        db.select(PlaylistSong.id).where(PlaylistSong.playlist_id == 1)
+        .order_by(PlaylistSong.position, PlaylistSong.id)
+    ).scalars().all()
+
+
+def move(entry_id, anchor_id, after=True):
+    position = positions.move_position(1, entry_id, anchor_id, after)
+    db.session.execute(db.update(PlaylistSong).where(PlaylistSong.id == entry_id).values(position=position))
+    db.session.commit()
+
+
+@pytest.mark.parametrize("after, anchor_id", [(True, 1), (False, 2)])
+def test_move_between_tied_positions_rebalances(app, after, anchor_id):
+    # Dos altas concurrentes pueden dejar 1 y 2 con la misma posición
+    make_playlist("i", "i", "j")
+    move(3, anchor_id, after)
+    assert order() == [1, 3, 2]
+
+
+def test_append_after_tie_keeps_order(app):
+    make_playlist("i", "i")
+    assert positions.append_position(1) > "i"
@@ -0,0 +1,8 @@
+from api.query_plans import check_playlist_plans
+
+
+def test_playlist_queries_use_indexes(app):
+    checks = check_playlist_plans()
+    assert checks
+    scans = [f"{c.route} [{c.name}]: {c.plan}" for c in checks if not c.ok]
+    assert scans == []
@@ -0,0 +1,16 @@
+from flask import Flask, jsonify
+
+from api.ratelimit import rate_limit
+
+
+def test_non_object_json_body_does_not_break_the_account_key():
+    app = Flask(__name__)
+
+    @app.route("/login", methods=["POST"])
+    @rate_limit("test-login", per_ip="100/minute", per_account="2/minute")
+    def login():
+        return jsonify({}), 200
+
+    client = app.test_client()
+    for body in ([1, 2], "email", 3, None):
+        assert client.post("/login", json=body).status_code == 200
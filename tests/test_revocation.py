@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from api.models import db, RevokedToken
+from api.revocation import RevocationIndex
+
+
+def rows():
+    return db.session.execute(select(func.count()).select_from(RevokedToken)).scalar()
+
+
+def test_revocation_reaches_the_index_only_after_commit(app, monkeypatch):
+    index = RevocationIndex(capacity=100)
+    monkeypatch.setattr("api.revocation.index", index)
+    expires = datetime.utcnow() + timedelta(hours=1)
+
+    index.revoke("jti-1", expires)
+    assert "jti-1" not in index.jtis
+    db.session.rollback()
+    assert "jti-1" not in index.jtis and rows() == 0
+
+    # El reintento tras el rollback vuelve a escribir la fila
+    index.revoke("jti-1", expires)
+    index.revoke("jti-1", expires)
+    db.session.commit()
+    assert "jti-1" in index.jtis and rows() == 1
+    assert index.is_revoked("jti-1")
+    assert not index.is_revoked("jti-2")
@@ -0,0 +1,38 @@
+import pytest
+
+from api import search
+from api.models import db, Track
+
+
+@pytest.fixture
+def like_only(app, monkeypatch):
+    # Sin tabla FTS: el mismo camino que en motores sin FTS5
+    monkeypatch.setattr(search, "is_fts_available", lambda: False)
+    db.session.add_all([
+        Track(id=str(i), name=name, artist="Varios", audio_url=f"https://a/{i}.mp3")
+        for i, name in enumerate(["100% Chill", "1000 Chill", "lo_fi", "lo-fi", "a\\b"], start=1)
+    ])
+    db.session.commit()
+    return app
+
+
+def names(results):
+    return [r["name"] for r in results]
+
+
+def test_like_search_treats_wildcards_literally(like_only):
+    assert names(search.search_tracks("100%")[0]) == ["100% Chill"]
+    assert names(search.search_tracks("lo_fi")[0]) == ["lo_fi"]
+    assert names(search.search_tracks("a\\b")[0]) == ["a\\b"]
+
+
+def test_like_search_pages_by_id(like_only):
+    first, last = search.search_tracks("chill", limit=1)
+    assert names(first) == ["100% Chill"] and last == (0, "1")
+    second, _ = search.search_tracks("chill", limit=1, after_score=last[0], after_id=last[1])
+    assert names(second) == ["1000 Chill"]
+
+
+def test_like_search_rejects_relevance_cursors(like_only):
+    with pytest.raises(ValueError):
+        search.search_tracks("chill", after_score=-3.2, after_id="1")